@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir  # noqa: E402
+from dfxsnippets.addData import encode_chunk  # noqa: E402
+from dfxsnippets.chunkCache import ChunkCache  # noqa: E402
+
+
+def replay(conn_method, chunk_files, cache):
+    # Prepare every chunk of a payload directory, as addData does for one measurement
+    start = time.perf_counter()
+    chunks = [
+        encode_chunk(conn_method, 'measurementID', files, i, len(chunk_files), cache)
+        for i, files in enumerate(chunk_files)
+    ]
+    return time.perf_counter() - start, chunks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to prepare a replay, cold and warm cache")
+    parser.add_argument("--chunks", help="Chunks in the payload directory", type=int, default=20)
+    parser.add_argument("--payloadSize", help="Generated payload size", type=int, default=4000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        payload_dir = os.path.join(directory, 'payload')
+        make_payload_dir(payload_dir, args.chunks, args.payloadSize)
+        chunk_files = [(os.path.join(payload_dir, 'payload' + str(i) + '.bin'),
+                        os.path.join(payload_dir, 'metadata' + str(i) + '.bin'),
+                        os.path.join(payload_dir, 'properties' + str(i) + '.json'))
+                       for i in range(args.chunks)]
+
+        print("{} chunks of {} bytes".format(args.chunks, args.payloadSize))
+        print("{:<12}{:>16}{:>16}{:>16}".format("transport", "no cache ms", "cold cache ms",
+                                                "warm cache ms"))
+        for conn_method in ('Websocket', 'REST'):
+            cache = ChunkCache(os.path.join(directory, 'cache_' + conn_method))
+            uncached, expected = replay(conn_method, chunk_files, None)
+            cold, _ = replay(conn_method, chunk_files, cache)
+            warm, chunks = replay(conn_method, chunk_files, cache)
+            assert chunks == expected
+            print("{:<12}{:>16.1f}{:>16.1f}{:>16.1f}".format(conn_method, uncached * 1e3,
+                                                             cold * 1e3, warm * 1e3))
@@ -0,0 +1,102 @@
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir  # noqa: E402
+from dfxsnippets.adddata_pb2 import DataRequest  # noqa: E402
+from dfxsnippets.chunkEncoder import (encode_rest_body, encode_ws_frame, open_payload,  # noqa: E402
+                                      set_request_id)
+
+
+def ws_before(payload_file, meta):
+    # What addData did before: read, bytes(), SerializeToString() and header concatenation
+    with open(payload_file, 'rb') as input_file:
+        payload = input_file.read()
+    data = DataRequest()
+    data.Params.ID = 'measurementID'
+    data.ChunkOrder = 1
+    data.Action = 'CHUNK::PROCESS'
+    data.StartTime = 5
+    data.EndTime = 10
+    data.Duration = 5.0
+    data.Meta = json.dumps(meta).encode()
+    data.Payload = bytes(payload)
+    return f'{"0506":4}{"abcdefghij":10}'.encode() + data.SerializeToString()
+
+
+def ws_after(payload_file, meta):
+    payload = open_payload(payload_file)
+    frame = encode_ws_frame('0506', 'measurementID', 1, 'CHUNK::PROCESS', 5, 10, 5.0,
+                            json.dumps(meta).encode(), payload)
+    if payload:
+        payload.close()
+    set_request_id(frame, 'abcdefghij')
+    return frame
+
+
+def rest_before(payload_file, meta):
+    # What addData did before, plus the json.dumps() and encode() done by requests.post(json=...)
+    with open(payload_file, 'rb') as input_file:
+        payload = input_file.read()
+    data = dict(ChunkOrder=1, Action='CHUNK::PROCESS', StartTime=5, EndTime=10, Duration=5.0)
+    data['Meta'] = json.dumps(meta)
+    data["Payload"] = base64.b64encode(payload).decode('utf-8')
+    return json.dumps(data).encode('utf-8')
+
+
+def rest_after(payload_file, meta):
+    payload = open_payload(payload_file)
+    body = encode_rest_body(1, 'CHUNK::PROCESS', 5, 10, 5.0, json.dumps(meta), payload)
+    if payload:
+        payload.close()
+    return body
+
+
+def measure(function, payload_file, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(payload_file, {"dfxsdk": "4.3.0"})
+    seconds = (time.perf_counter() - start) / repeat
+
+    # Peak of the bytes allocated while building one chunk, a measure of the copies made
+    tracemalloc.start()
+    function(payload_file, {"dfxsdk": "4.3.0"})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes copied and time to build one chunk")
+    parser.add_argument("--payloadDir", help="Directory of payload files (default: generated)")
+    parser.add_argument("--payloadSize", help="Generated payload size", type=int, default=4000000)
+    parser.add_argument("--repeat", help="Chunks built per measurement", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.payloadDir:
+            directory = args.payloadDir
+        else:
+            make_payload_dir(directory, 1, args.payloadSize)
+        payload_file = os.path.join(directory, 'payload0.bin')
+        size = os.path.getsize(payload_file)
+        assert bytes(ws_after(payload_file, {"dfxsdk": "4.3.0"})) == ws_before(
+            payload_file, {"dfxsdk": "4.3.0"})
+        assert rest_after(payload_file, {"dfxsdk": "4.3.0"}) == rest_before(
+            payload_file, {"dfxsdk": "4.3.0"})
+
+        print("payload size: {} bytes".format(size))
+        print("{:<22}{:>12}{:>22}{:>12}".format("path", "ms/chunk", "bytes copied/chunk",
+                                                "x payload"))
+        for name, function in (('websocket before', ws_before), ('websocket after', ws_after),
+                               ('REST before', rest_before), ('REST after', rest_after)):
+            seconds, peak = measure(function, payload_file, args.repeat)
+            print("{:<22}{:>12.2f}{:>22}{:>12.2f}".format(name, seconds * 1e3, peak,
+                                                          peak / size))
@@ -0,0 +1,105 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir  # noqa: E402
+from dfxsnippets.addData import encode_chunk  # noqa: E402
+from dfxsnippets.chunkEncoder import compress_body  # noqa: E402
+from dfxsnippets.payloadIndex import PayloadIndex  # noqa: E402
+
+
+def make_signal_payloads(directory, num_chunks, payload_size):
+    # Payloads of noisy float32 samples instead of random bytes, which don't compress at all
+    make_payload_dir(directory, num_chunks, 0)
+    for i in range(num_chunks):
+        samples = array('f', (100 * (j % 500) / 500.0 + random.gauss(0, 1)
+                              for j in range(payload_size // 4)))
+        with open(os.path.join(directory, 'payload' + str(i) + '.bin'), 'wb') as f:
+            samples.tofile(f)
+
+
+def deflate_frames(frames, level):
+    # What permessage-deflate sends: one compressor for the whole connection (context
+    # takeover), each message flushed and without its 4 byte 00 00 ff ff tail
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+                                  zlib.DEFLATED, -zlib.MAX_WBITS, 5)
+    return [compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)[:-4]
+            for frame in frames]
+
+
+def measure(function, bodies, repeat):
+    # Best CPU time over repeat runs, and the bytes it produced
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        out = function(bodies)
+        best = min(best, time.process_time() - start)
+    return best, sum(len(body) for body in out)
+
+
+def report(name, raw, cpu, wire, num_chunks):
+    print("{:16} {:10.1f} kB  {:6.1%} of raw  {:8.2f} ms CPU/chunk".format(
+        name, wire / 1e3, wire / raw, cpu / num_chunks * 1e3))
+
+
+def run(input_directory, args):
+    chunk_files = PayloadIndex(input_directory).chunk_files
+    num_chunks = len(chunk_files)
+    encode = {
+        conn_method: [
+            bytes(encode_chunk(conn_method, 'measurementID', files, i, num_chunks).Body)
+            for i, files in enumerate(chunk_files)
+        ]
+        for conn_method in ('REST', 'Websocket')
+    }
+
+    settings = [('gzip', level) for level in (1, 6, 9)]
+    try:
+        import zstandard  # noqa: F401
+        settings += [('zstd', level) for level in (1, 3, 9, 19)]
+    except ImportError:
+        print("zstandard is not installed, skipping zstd")
+
+    raw = sum(len(body) for body in encode['REST'])
+    print("REST, {} chunks:".format(num_chunks))
+    report("none", raw, 0.0, raw, num_chunks)
+    for encoding, level in settings:
+        cpu, wire = measure(lambda bodies: [compress_body(b, encoding, level) for b in bodies],
+                            encode['REST'], args.repeat)
+        report("{} {}".format(encoding, level), raw, cpu, wire, num_chunks)
+
+    raw = sum(len(frame) for frame in encode['Websocket'])
+    print("Websocket, {} chunks:".format(num_chunks))
+    report("none", raw, 0.0, raw, num_chunks)
+    for level in (1, None, 9):
+        cpu, wire = measure(lambda frames: deflate_frames(frames, level), encode['Websocket'],
+                            args.repeat)
+        report("deflate {}".format('default' if level is None else level), raw, cpu, wire,
+               num_chunks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="CPU time versus bytes on the wire of compressing add data chunks: gzip "
+        "and zstd REST bodies, and websocket permessage-deflate")
+    parser.add_argument("--payloadDir", help="A real payload directory to compress", default=None)
+    parser.add_argument("--chunks", help="Synthetic chunks without --payloadDir", type=int,
+                        default=10)
+    parser.add_argument("--payloadSize", help="Synthetic payload bytes per chunk", type=int,
+                        default=400000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.payloadDir:
+        run(args.payloadDir, args)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            make_signal_payloads(directory, args.chunks, args.payloadSize)
+            run(directory, args)
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import percentile  # noqa: E402
+from dfxsnippets.addData import addData  # noqa: E402
+from dfxsnippets.chunkEncoder import EncodedChunk  # noqa: E402
+from dfxsnippets.deadlineScheduler import DeadlineScheduler  # noqa: E402
+from dfxsnippets.metrics import Metrics  # noqa: E402
+
+
+class SimulatedSession(addData):
+    # An addData whose chunks are acknowledged after a random latency instead of being sent;
+    # records when each chunk was released
+    def __init__(self, args, scheduler):
+        super().__init__('measurementID', 'token', None, object(), None,
+                         metrics=Metrics(quiet=True), scheduler=scheduler)
+        self.args = args
+        self.released = []
+
+    async def send_chunk(self, chunk):
+        self.released.append(asyncio.get_running_loop().time())
+        encode_until = time.perf_counter() + self.args.encode / 1e3  # Encoding the next chunk
+        while time.perf_counter() < encode_until:
+            pass
+        await asyncio.sleep(random.uniform(0, 2 * self.args.latency / 1e3))
+        return True
+
+
+class SleepScheduler():
+    # The same deadlines, with an asyncio.sleep() per measurement instead of a shared heap
+    stats = dict(waits=0, wakeups=0)
+
+    async def wait_until(self, deadline):
+        await asyncio.sleep(max(0.0, deadline - asyncio.get_running_loop().time()))
+
+
+async def chunks(args):
+    for i in range(args.chunks):
+        action = 'FIRST::PROCESS' if i == 0 else 'LAST::PROCESS' if i == args.chunks - 1 \
+            else 'CHUNK::PROCESS'
+        yield EncodedChunk(i, action, i * args.duration, (i + 1) * args.duration,
+                           args.duration, b'')
+
+
+async def sleep_after_ack(session):
+    # Before: send a chunk, wait for its ack, then sleep for its duration
+    async for chunk in chunks(session.args):
+        await session.send_chunk(chunk)
+        if "LAST" not in chunk.Action:
+            await asyncio.sleep(chunk.Duration)
+
+
+async def lag_monitor(lags, interval=0.01):
+    # How late the event loop runs a task that should wake up every interval seconds
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run(args, mode):
+    scheduler = SleepScheduler() if mode == 'sleep' else DeadlineScheduler()
+    sessions = [SimulatedSession(args, scheduler) for _ in range(args.sessions)]
+    lags = []
+    monitor = asyncio.ensure_future(lag_monitor(lags))
+
+    async def session_task(session):
+        await asyncio.sleep(random.uniform(0, args.stagger))  # They don't all start at once
+        if mode == 'before':
+            await sleep_after_ack(session)
+        else:
+            await session.sendAsync('realtime', chunks=chunks(args))
+
+    cpu = time.process_time()
+    await asyncio.gather(*[session_task(session) for session in sessions])
+    cpu = time.process_time() - cpu
+    monitor.cancel()
+    # How far from its StartTime after the first chunk each chunk was released
+    errors = [released - session.released[0] - i * args.duration for session in sessions
+              for i, released in enumerate(session.released)]
+    return errors, cpu, lags, scheduler.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Real-time pacing of many simulated measurements on one event loop: "
+        "sleeping for the chunk duration after every ack versus RealtimePacer deadlines, with "
+        "a sleep per measurement and on a shared DeadlineScheduler")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--chunks", help="Chunks per measurement", type=int, default=10)
+    parser.add_argument("--duration", help="Seconds per chunk", type=float, default=0.5)
+    parser.add_argument("--latency", help="Mean ack latency in ms", type=float, default=40.0)
+    parser.add_argument("--encode", help="CPU ms per chunk sent", type=float, default=0.1)
+    parser.add_argument("--stagger", help="Seconds over which the measurements start",
+                        type=float, default=1.0)
+    args = parser.parse_args()
+
+    print("{} measurements of {} chunks of {} s, {} ms mean ack latency".format(
+        args.sessions, args.chunks, args.duration, args.latency))
+    for name, mode in (("sleep after ack", 'before'), ("sleep to deadline", 'sleep'),
+                       ("DeadlineScheduler", 'after')):
+        errors, cpu, lags, stats = asyncio.run(run(args, mode))
+        last = args.chunks - 1
+        print("{:18} release error p50 {:7.1f} ms  p99 {:7.1f} ms  last chunk {:7.1f} ms  "
+              "CPU {:5.2f} s  loop lag p99 {:5.1f} ms".format(
+                  name + ':', percentile(errors, 50) * 1e3, percentile(errors, 99) * 1e3,
+                  percentile(errors[last::args.chunks], 50) * 1e3, cpu,
+                  percentile(lags, 99) * 1e3))
+        if mode == 'after':
+            print("{:18} {} waits, {} timer wake-ups".format('', stats['waits'],
+                                                             stats['wakeups']))
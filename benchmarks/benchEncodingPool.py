@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir  # noqa: E402
+from dfxsnippets.addData import addData  # noqa: E402
+from dfxsnippets.encodingPool import EncodingPool  # noqa: E402
+from dfxsnippets.metrics import Metrics  # noqa: E402
+
+
+async def loop_lag(stop, lags, interval=0.001):
+    # How late the event loop wakes up a task that sleeps for interval
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def consume(adddataObj, sync):
+    total = 0
+    if sync:  # Before: prepared on the event loop thread
+        for chunk in adddataObj.iter_chunks():
+            total += len(chunk.Body)
+            await asyncio.sleep(0)
+    else:
+        async for chunk in adddataObj.aiter_chunks():
+            total += len(chunk.Body)
+    return total
+
+
+async def run(input_directories,
+              conn_method,
+              compression=None,
+              executor=None,
+              encoder=None,
+              sync=False):
+    # Prepare every chunk of every measurement at the same time, as many sessions would
+    ws_obj = object() if conn_method == 'Websocket' else None
+    adddataObjs = [
+        addData('measurementID' + str(i),
+                'token',
+                'http://localhost',
+                ws_obj,
+                input_directory,
+                executor=executor,
+                encoder=encoder,
+                compression=compression,
+                metrics=Metrics(quiet=True)) for i, input_directory in enumerate(input_directories)
+    ]
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.ensure_future(loop_lag(stop, lags))
+    start = time.perf_counter()
+    sizes = await asyncio.gather(*(consume(obj, sync) for obj in adddataObjs))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return elapsed, sum(sizes), max(lags) if lags else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Preparing the chunks of many measurements: on the event loop, in a "
+        "process pool one chunk at a time, and with an EncodingPool")
+    parser.add_argument("--measurements", type=int, default=4)
+    parser.add_argument("--chunks", help="Chunks per measurement", type=int, default=20)
+    parser.add_argument("--payloadSize", help="Payload bytes per chunk", type=int, default=400000)
+    parser.add_argument("--connectionMethod", choices=["REST", "Websocket"], default="REST")
+    parser.add_argument("--compression",
+                        help="Compress REST bodies too, which makes encoding CPU bound",
+                        choices=["gzip", "zstd"],
+                        default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--prefetch", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_directories = []
+        for i in range(args.measurements):
+            input_directories.append(os.path.join(directory, str(i)))
+            make_payload_dir(input_directories[-1], args.chunks, args.payloadSize)
+
+        options = (input_directories, args.connectionMethod, args.compression)
+        results = [("on the event loop", asyncio.run(run(*options, sync=True)))]
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results.append(("process pool", asyncio.run(run(*options, executor=executor))))
+        with EncodingPool(args.workers, args.prefetch) as encoder:
+            results.append(("EncodingPool", asyncio.run(run(*options, encoder=encoder))))
+
+    print("{} measurements x {} chunks, {} workers".format(args.measurements, args.chunks,
+                                                           args.workers or os.cpu_count()))
+    for name, (elapsed, size, lag) in results:
+        print("{:18} {:8.1f} chunks/s  {:8.1f} MB/s  max loop lag {:7.2f} ms".format(
+            name + ':', args.measurements * args.chunks / elapsed, size / elapsed / 1e6,
+            lag * 1e3))
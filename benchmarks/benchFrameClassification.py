@@ -0,0 +1,42 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dfxsnippets.websocketHelper import WebsocketConfig, WebsocketHandler  # noqa: E402
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'default.config')
+
+
+def classify_before(response):
+    # What handle_recieve() used to do for every frame
+    with open(CONFIG_PATH) as json_file:
+        data = json.load(json_file)
+
+        if len(response) == int(data["Subscribe_status"]):
+            return 'subscribeStatus'
+        elif len(response) <= int(data["Adddata_status"]):
+            return 'addDataStatus'
+        else:
+            return 'chunk'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame receive classification overhead")
+    parser.add_argument("--number", help="Frames per measurement", type=int, default=20000)
+    args = parser.parse_args()
+
+    handler = WebsocketHandler('', '', config=WebsocketConfig.from_file(CONFIG_PATH))
+    handler.subscribe_queue('abcdefghij')
+    frames = [b'abcdefghij200', b'abcdefghij200' + bytes(40000)]
+
+    print("{:<28}{:>14}".format("frame", "us/frame"))
+    for frame in frames:
+        for name, function in (('before (len + config)', classify_before),
+                               ('after (route + header)', handler.classify)):
+            seconds = timeit.timeit(lambda: function(frame), number=args.number)
+            print("{:<28}{:>14.3f}  ({} bytes)".format(name, seconds / args.number * 1e6,
+                                                       len(frame)))
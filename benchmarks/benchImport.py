@@ -0,0 +1,38 @@
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ENTRY_POINTS = ('measure', 'ingest', 'dfxsnippets.addData', 'dfxsnippets.subscribeResults',
+                'dfxsnippets.websocketHelper', 'dfxsnippets.restHelper')
+HEAVY = ('requests', 'websockets', 'google.protobuf')
+
+
+def import_time(module):
+    # `python -X importtime` of a fresh interpreter: the cumulative microseconds of importing
+    # module, and which of HEAVY it pulled in
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, total, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(total)
+    return cumulative[module], [heavy for heavy in HEAVY if heavy in cumulative]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time of the entry points")
+    parser.add_argument("--repeat", help="Fresh interpreters per entry point", type=int,
+                        default=5)
+    args = parser.parse_args()
+
+    print("{:<32}{:>12}  {}".format("module", "ms (best)", "imports"))
+    for module in ENTRY_POINTS:
+        runs = [import_time(module) for _ in range(args.repeat)]
+        best = min(total for total, _ in runs)
+        print("{:<32}{:>12.1f}  {}".format(module, best / 1e3, ', '.join(runs[0][1])))
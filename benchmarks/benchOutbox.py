@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir, percentile  # noqa: E402
+from dfxsnippets.addData import addData, encode_chunk  # noqa: E402
+from dfxsnippets.createMeasurement import createMeasurement  # noqa: E402
+from dfxsnippets.metrics import Metrics  # noqa: E402
+from dfxsnippets.mockServer import MockDfxServer  # noqa: E402
+from dfxsnippets.outbox import Outbox, OutboxDrainer  # noqa: E402
+from dfxsnippets.payloadIndex import PayloadIndex  # noqa: E402
+from dfxsnippets.restHelper import RestHandler  # noqa: E402
+
+
+async def link(args, server):
+    # The network is down for the first args.outage seconds
+    await asyncio.sleep(args.outage)
+    await server.start()
+
+
+async def capture(args, chunk_files, handle):
+    # A chunk is captured every args.interval seconds and handed to handle(i, files); returns
+    # how long each hand-off kept the capture waiting
+    latencies = []
+    for i, files in enumerate(chunk_files):
+        start = time.perf_counter()
+        await handle(i, files)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(max(0.0, args.interval - latencies[-1]))
+    return latencies
+
+
+async def direct(args, server, chunk_files, metrics):
+    # Before: each chunk is sent as it is captured, and lost if that fails
+    rest_obj = RestHandler('token', server.rest_url)
+    adddataObj = None
+    lost = 0
+
+    async def send(i, files):
+        nonlocal adddataObj, lost
+        try:
+            if adddataObj is None:
+                createmeasurementObj = createMeasurement('studyID', 'token', server.rest_url,
+                                                         restobj=rest_obj, metrics=metrics)
+                adddataObj = addData(await createmeasurementObj.createAsync(), 'token',
+                                     server.rest_url, None, None, restobj=rest_obj,
+                                     metrics=metrics)
+            chunk = encode_chunk('REST', adddataObj.measurementID, files, i, len(chunk_files))
+            if not await adddataObj.send_chunk(chunk):
+                lost += 1
+        except (OSError, ValueError):
+            lost += 1
+
+    outage = asyncio.ensure_future(link(args, server))
+    latencies = await capture(args, chunk_files, send)
+    uploaded = time.perf_counter()
+    await outage
+    rest_obj.close()
+    return latencies, lost, uploaded
+
+
+async def outboxed(args, server, chunk_files, metrics, path):
+    # After: each chunk is put in an Outbox as it is captured, and uploaded in the background
+    outbox = Outbox(path, 'REST')
+    outbox.add_measurement('key', 'studyID')
+
+    async def put(i, files):
+        outbox.put('key', outbox.encode(files, i, len(chunk_files)))
+
+    drainer = OutboxDrainer(outbox, 'token', server.rest_url, None, metrics=metrics,
+                            window=args.window, poll_interval=0.01, retry_delay=0.2)
+    outage = asyncio.ensure_future(link(args, server))
+    draining = asyncio.ensure_future(drainer.run())
+    latencies = await capture(args, chunk_files, put)
+    await outage
+    while outbox.pending() or drainer.stats['measurements'] < 1:
+        await asyncio.sleep(0.01)
+    uploaded = time.perf_counter()
+    draining.cancel()
+    await asyncio.gather(draining, return_exceptions=True)
+    await drainer.close()
+    outbox.close()
+    return latencies, args.chunks - drainer.stats['chunks'], uploaded
+
+
+async def run(args, mode, chunk_files, path):
+    server = MockDfxServer(args.host, args.restPort, args.wsPort, rest_delay=args.restDelay)
+    metrics = Metrics(quiet=True)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'direct':
+            latencies, lost, uploaded = await direct(args, server, chunk_files, metrics)
+        else:
+            latencies, lost, uploaded = await outboxed(args, server, chunk_files, metrics, path)
+    await server.stop()
+    return latencies, lost, uploaded - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Capturing chunks while the network is down for a while: sending each "
+        "chunk as it is captured versus putting it in an Outbox drained in the background")
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--payloadSize", help="Payload bytes per chunk", type=int, default=200000)
+    parser.add_argument("--interval", help="Seconds between captured chunks", type=float,
+                        default=0.05)
+    parser.add_argument("--outage", help="Seconds the network is down at first", type=float,
+                        default=1.0)
+    parser.add_argument("--restDelay", help="Mock REST round trip in seconds", type=float,
+                        default=0.1)
+    parser.add_argument("--window", help="Chunks in flight while draining", type=int, default=4)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--restPort", type=int, default=18443)
+    parser.add_argument("--wsPort", type=int, default=18080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_payload_dir(os.path.join(directory, 'payloads'), args.chunks, args.payloadSize)
+        chunk_files = PayloadIndex(os.path.join(directory, 'payloads')).chunk_files
+        print("{} chunks captured every {} s, network down for the first {} s, {} s REST "
+              "round trip".format(args.chunks, args.interval, args.outage, args.restDelay))
+        for name, mode in (("send as captured", 'direct'), ("Outbox", 'outbox')):
+            latencies, lost, elapsed = asyncio.run(
+                run(args, mode, chunk_files, os.path.join(directory, 'outbox.db')))
+            print("{:17} capture wait p50 {:7.2f} ms  p99 {:7.2f} ms  {:3} lost  "
+                  "all uploaded after {:5.2f} s".format(name + ':',
+                                                        percentile(latencies, 50) * 1e3,
+                                                        percentile(latencies, 99) * 1e3, lost,
+                                                        elapsed))
@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from glob import glob
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir  # noqa: E402
+from dfxsnippets.payloadIndex import MANIFEST_NAME, PayloadIndex  # noqa: E402
+
+
+def glob_index(directory):
+    # What addData.index_data() did before: three globs and file names rebuilt from the count
+    total_num_payload = len(glob(os.path.join(directory, 'payload*.bin')))
+    total_num_meta = len(glob(os.path.join(directory, 'metadata*.bin')))
+    total_num_properties = len(glob(os.path.join(directory, 'properties*.json')))
+    if total_num_meta != total_num_payload != total_num_properties:
+        raise ValueError('Missing files')
+    return [(os.path.join(directory, 'payload' + str(i) + '.bin'),
+             os.path.join(directory, 'metadata' + str(i) + '.bin'),
+             os.path.join(directory, 'properties' + str(i) + '.json'))
+            for i in range(total_num_payload)]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to index and check a payload directory")
+    parser.add_argument("--chunks", help="Chunks in the payload directory", type=int,
+                        default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_payload_dir(directory, args.chunks, 16)
+
+        print("{} chunks".format(args.chunks))
+        print("{:<44}{:>10}".format("", "ms"))
+        print("{:<44}{:>10.1f}".format("glob, names only, no checks (before)",
+                                       timed(glob_index, directory) * 1e3))
+        print("{:<44}{:>10.1f}".format("PayloadIndex, no manifest yet",
+                                       timed(PayloadIndex, directory) * 1e3))
+        print("{:<44}{:>10.1f}".format("PayloadIndex, saved manifest",
+                                       timed(PayloadIndex, directory) * 1e3))
+        os.remove(os.path.join(directory, MANIFEST_NAME))
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dfxsnippets.dfxClient import DfxClient  # noqa: E402
+from dfxsnippets.metrics import Metrics  # noqa: E402
+from dfxsnippets.mockServer import MockDfxServer  # noqa: E402
+from dfxsnippets.payloadTail import END_MARKER_NAME  # noqa: E402
+
+
+async def capture(directory, args):
+    # Write a chunk every args.duration seconds like the DFX SDK would, then the end marker;
+    # returns when the capture ended
+    for i in range(args.chunks):
+        await asyncio.sleep(args.duration)
+        with open(os.path.join(directory, 'payload' + str(i) + '.bin'), 'wb') as f:
+            f.write(os.urandom(args.payloadSize))
+        with open(os.path.join(directory, 'metadata' + str(i) + '.bin'), 'w') as f:
+            json.dump({"dfxsdk": "4.3.0"}, f)
+        with open(os.path.join(directory, 'properties' + str(i) + '.json'), 'w') as f:
+            json.dump({"chunk_number": i, "start_time_s": int(args.duration * i),
+                       "end_time_s": int(args.duration * (i + 1)),
+                       "duration_s": args.duration}, f)
+    open(os.path.join(directory, END_MARKER_NAME), 'w').close()
+    return time.perf_counter()
+
+
+async def run(args, follow, use_inotify=True):
+    # Seconds from the end of the capture until the last result arrived
+    server = MockDfxServer(args.host, args.restPort, args.wsPort, result_delay=args.resultDelay,
+                           rest_delay=args.restDelay)
+    await server.start()
+    with tempfile.TemporaryDirectory() as directory:
+        async with DfxClient('token', server.rest_url, server.ws_url, conn_method='REST',
+                             metrics=Metrics(quiet=True)) as client:
+            capturing = asyncio.ensure_future(capture(directory, args))
+            if follow:
+                follow_chunks = client.follow_chunks
+                client.follow_chunks = lambda *a: follow_chunks(*a, use_inotify=use_inotify)
+            else:  # Before: wait for the whole capture, then upload the directory
+                await capturing
+            await client.measure('studyID', directory, pacing='ack', follow=follow)
+            done = time.perf_counter()
+            ended = await capturing
+    await server.stop()
+    return done - ended
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time from the end of a capture to the last result against the mock "
+        "server: uploading the payload directory after the capture versus following it")
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--duration", help="Seconds per chunk", type=float, default=0.5)
+    parser.add_argument("--payloadSize", help="Payload bytes per chunk", type=int, default=200000)
+    parser.add_argument("--resultDelay", help="Mock result delay", type=float, default=0.2)
+    parser.add_argument("--restDelay", help="Mock REST round trip in seconds", type=float,
+                        default=0.1)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--restPort", type=int, default=18443)
+    parser.add_argument("--wsPort", type=int, default=18080)
+    args = parser.parse_args()
+
+    print("{} chunks of {} s, {} s REST round trip".format(args.chunks, args.duration,
+                                                           args.restDelay))
+    for name, options in (("after capture", (False, )), ("follow, inotify", (True, True)),
+                          ("follow, polling", (True, False))):
+        print("{:16} last result {:6.2f} s after the capture ended".format(
+            name + ':', asyncio.run(run(args, *options))))
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dfxsnippets.resultDecoder import (ColumnarResults, DecodeSink,  # noqa: E402
+                                       decode_json_result)
+from dfxsnippets.resultSink import FileSink  # noqa: E402
+
+
+def make_results(count, size, signals):
+    # Result frame bodies like the mock server sends
+    return [
+        json.dumps(
+            dict(ID='measurementID',
+                 ChunkOrder=i,
+                 Results={'SIGNAL_' + str(s): [70.0 + i] * size
+                          for s in range(signals)})).encode() for i in range(count)
+    ]
+
+
+async def feed(sink, bodies, interval):
+    # Results arrive one frame every interval seconds; returns when the last one arrived
+    sink.start()
+    for counter, body in enumerate(bodies, 1):
+        sink.put(counter, memoryview(body))
+        await asyncio.sleep(interval)
+    last = time.perf_counter()
+    await sink.close()
+    return last
+
+
+def files_then_parse(bodies, interval, directory):
+    # Before: the results are saved as files, and analytics parse every file again
+    last = asyncio.run(feed(FileSink(directory), bodies, interval))
+    columns = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'result_*.bin'))):
+        with open(path, 'rb') as result_file:
+            data = json.load(result_file)
+        for signal, values in data['Results'].items():
+            columns.setdefault(signal, array('d')).fromlist(values)
+    return time.perf_counter() - last, sum(len(values) for values in columns.values())
+
+
+def decode_as_received(bodies, interval, directory=None):
+    # After: decoded into columns as they arrive (and, with directory, saved as files too)
+    accumulator = ColumnarResults()
+    raw = FileSink(directory) if directory else None
+    last = asyncio.run(feed(DecodeSink(decode_json_result, accumulator, sink=raw), bodies,
+                            interval))
+    return time.perf_counter() - last, sum(len(values) for values in accumulator.values.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time until results are ready for analytics, once the last one arrived: "
+        "parsing saved files versus DecodeSink")
+    parser.add_argument("--results", type=int, default=2000)
+    parser.add_argument("--values", help="Values per signal in each result", type=int,
+                        default=300)
+    parser.add_argument("--signals", help="Signals in each result", type=int, default=8)
+    parser.add_argument("--interval", help="Seconds between results", type=float,
+                        default=0.001)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = make_results(args.results, args.values, args.signals)
+    print("{} results of {:.1f} kB".format(len(bodies), len(bodies[0]) / 1e3))
+    for name, function, keep_files in (("files, then parse", files_then_parse, True),
+                                       ("decode as received", decode_as_received, False),
+                                       ("decode + keep files", decode_as_received, True)):
+        best, values = float('inf'), 0
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as directory:
+                elapsed, values = function(bodies, args.interval,
+                                           directory if keep_files else None)
+            best = min(best, elapsed)
+        print("{:20} {:8.1f} ms after the last result  {} values".format(
+            name + ':', best * 1e3, values))
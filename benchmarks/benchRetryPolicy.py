@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir  # noqa: E402
+from dfxsnippets.addData import addData  # noqa: E402
+from dfxsnippets.createMeasurement import createMeasurement  # noqa: E402
+from dfxsnippets.metrics import Metrics  # noqa: E402
+from dfxsnippets.mockServer import MockDfxServer  # noqa: E402
+from dfxsnippets.payloadIndex import PayloadIndex  # noqa: E402
+from dfxsnippets.restHelper import RestHandler  # noqa: E402
+from dfxsnippets.retryPolicy import RetryPolicy  # noqa: E402
+from dfxsnippets.websocketHelper import WebsocketHandler  # noqa: E402
+
+
+async def measurement(args, rest_obj, ws_obj, manifest, metrics, retry_policy):
+    # Create a measurement and send all of its chunks; True if every chunk was acknowledged
+    createmeasurementObj = createMeasurement('studyID',
+                                             'token',
+                                             rest_obj.rest_url,
+                                             restobj=rest_obj,
+                                             metrics=metrics,
+                                             retry_policy=retry_policy)
+    try:
+        measurementID = await createmeasurementObj.createAsync()
+    except ValueError:
+        return False
+    adddataObj = addData(measurementID,
+                         'token',
+                         rest_obj.rest_url,
+                         ws_obj if args.connectionMethod == 'Websocket' else None,
+                         None,
+                         restobj=rest_obj,
+                         metrics=metrics,
+                         manifest=manifest,
+                         retry_policy=retry_policy)
+    return await adddataObj.sendAsync('window', args.window)
+
+
+async def run(args, manifest, retry_policy):
+    server = MockDfxServer(args.host, args.restPort, args.wsPort, max_rate=args.maxRate)
+    await server.start()
+    metrics = Metrics(quiet=True)
+    rest_obj = RestHandler('token', server.rest_url)
+    ws_obj = WebsocketHandler('token', server.ws_url, metrics=metrics)
+    await ws_obj.connect_ws()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # "Error adding data" for every refusal
+        results = await asyncio.gather(*(measurement(args, rest_obj, ws_obj, manifest, metrics,
+                                                     retry_policy)
+                                         for _ in range(args.measurements)))
+    elapsed = time.perf_counter() - start
+
+    await ws_obj.handle_close()
+    rest_obj.close()
+    await server.stop()
+    return sum(results), elapsed, server.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Many measurements against a mock server that throttles above --maxRate "
+        "requests per second: without retries, retrying straight away, and with a RetryPolicy")
+    parser.add_argument("--measurements", type=int, default=20)
+    parser.add_argument("--chunks", help="Chunks per measurement", type=int, default=10)
+    parser.add_argument("--payloadSize", help="Payload bytes per chunk", type=int, default=20000)
+    parser.add_argument("--window", help="Chunks in flight per measurement", type=int, default=4)
+    parser.add_argument("--connectionMethod", choices=["REST", "Websocket"], default="Websocket")
+    parser.add_argument("--maxRate", help="Requests per second the mock accepts", type=float,
+                        default=50.0)
+    parser.add_argument("--maxAttempts", type=int, default=8)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--restPort", type=int, default=18443)
+    parser.add_argument("--wsPort", type=int, default=18080)
+    args = parser.parse_args()
+
+    policies = [
+        ("no retries", lambda: None),
+        # Same attempts, but sent again at once and never slowing down
+        ("immediate retry", lambda: RetryPolicy(args.maxAttempts, backoff_base=0.0,
+                                                throttle_statuses=())),
+        ("RetryPolicy", lambda: RetryPolicy(args.maxAttempts)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        make_payload_dir(directory, args.chunks, args.payloadSize)
+        manifest = PayloadIndex(directory)
+        print("{} measurements x {} chunks, {} over {} requests/s at most".format(
+            args.measurements, args.chunks, args.connectionMethod, args.maxRate))
+        for name, make_policy in policies:
+            retry_policy = make_policy()
+            completed, elapsed, stats = asyncio.run(run(args, manifest, retry_policy))
+            requests = stats['measurements'] + stats['chunks'] + stats['duplicates']
+            print("{:16} {:3} completed  {:5} throttled  {:6.1f} accepted/s  {:6.2f} s".format(
+                name + ':', completed, stats['throttled'], requests / elapsed, elapsed))
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import percentile  # noqa: E402
+from dfxsnippets.sendQueue import SendQueue  # noqa: E402
+
+
+def frame(route, size):
+    return route + b'0' * 10 + bytes(size)
+
+
+async def produce(queue, stream, route, size, count, interval, waits, fair):
+    # Put a frame every interval seconds (or as fast as the queue lets us, with 0), recording
+    # how long each waited to be sent
+    sent = []
+    for _ in range(count):
+        start = time.perf_counter()
+        future = await queue.put(frame(route, size), stream if fair else None)
+        sent.append((start, future))
+        await asyncio.sleep(interval)
+    for start, future in sent:
+        await future
+        waits.append(future.result() - start)
+
+
+async def drain(queue, bandwidth):
+    # Stands in for the connection: sends at most bandwidth bytes per second
+    while True:
+        content, future = await queue.get()
+        await asyncio.sleep(len(content) / bandwidth)
+        future.set_result(time.perf_counter())
+
+
+async def run(args, fair):
+    queue = SendQueue(args.highWater, args.lowWater)
+    sender = asyncio.ensure_future(drain(queue, args.bandwidth * 1e6))
+    heavy, light, control = [], [], []
+    producers = [
+        produce(queue, 'heavy', b'0506', args.heavySize, args.heavyFrames, 0, heavy, fair)
+    ]
+    for i in range(args.lightStreams):
+        producers.append(
+            produce(queue, 'light' + str(i), b'0506', args.lightSize, args.lightFrames,
+                    args.lightInterval, light, fair))
+    producers.append(
+        produce(queue, None, b'0510', 100, args.lightFrames, args.lightInterval, control, fair))
+    await asyncio.gather(*producers)
+    sender.cancel()
+    return heavy, light, control, queue.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Send queue latency of small measurements next to a bulk one")
+    parser.add_argument("--bandwidth", help="Simulated link MB/sec", type=float, default=50.0)
+    parser.add_argument("--heavySize", help="Bytes per frame of the bulk measurement", type=int,
+                        default=1000000)
+    parser.add_argument("--heavyFrames", type=int, default=40)
+    parser.add_argument("--lightStreams", help="Small measurements", type=int, default=4)
+    parser.add_argument("--lightSize", help="Bytes per frame of the small measurements",
+                        type=int, default=20000)
+    parser.add_argument("--lightFrames", type=int, default=40)
+    parser.add_argument("--lightInterval", help="Seconds between frames of a small measurement",
+                        type=float, default=0.02)
+    parser.add_argument("--highWater", type=int, default=4 * 2**20)
+    parser.add_argument("--lowWater", type=int, default=1 * 2**20)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for fair in (False, True):
+        heavy, light, control, stats = loop.run_until_complete(run(args, fair))
+        print("{}:".format("per-measurement round-robin" if fair else "single FIFO"))
+        print("  bulk wait p50/p99:    {:.1f} / {:.1f} ms".format(
+            percentile(heavy, 50) * 1e3,
+            percentile(heavy, 99) * 1e3))
+        print("  small wait p50/p99:   {:.1f} / {:.1f} ms".format(
+            percentile(light, 50) * 1e3,
+            percentile(light, 99) * 1e3))
+        print("  control wait p50/p99: {:.1f} / {:.1f} ms".format(
+            percentile(control, 50) * 1e3,
+            percentile(control, 99) * 1e3))
+        print("  max queued:           {:.2f} MB (high water {:.2f} MB), {} waits".format(
+            stats['max_queued_bytes'] / 1e6, args.highWater / 1e6, stats['waits']))
+    loop.close()
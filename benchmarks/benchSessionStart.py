@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import percentile  # noqa: E402
+from dfxsnippets.createMeasurement import createMeasurement  # noqa: E402
+from dfxsnippets.measurementPool import MeasurementPool  # noqa: E402
+from dfxsnippets.metrics import Metrics  # noqa: E402
+from dfxsnippets.mockServer import MockDfxServer  # noqa: E402
+from dfxsnippets.restHelper import RestHandler  # noqa: E402
+from dfxsnippets.websocketHelper import WebsocketHandler  # noqa: E402
+
+
+async def cold_start(server, rest_obj, metrics, latencies):
+    # Before: connect, then create the measurement, like measure.py
+    start = time.perf_counter()
+    ws_obj = WebsocketHandler('token', server.ws_url, metrics=metrics)
+    await ws_obj.connect_ws()
+    createmeasurementObj = createMeasurement('studyID',
+                                             'token',
+                                             server.rest_url,
+                                             restobj=rest_obj,
+                                             metrics=metrics)
+    await createmeasurementObj.createAsync()
+    latencies.append(time.perf_counter() - start)
+    await ws_obj.handle_close()
+
+
+async def pooled_start(pool, latencies):
+    # After: check out a measurement ID and a connection
+    start = time.perf_counter()
+    _, ws_obj = await pool.checkout('studyID')
+    latencies.append(time.perf_counter() - start)
+    pool.checkin_connection(ws_obj)
+
+
+async def bursts(args, start_session):
+    for _ in range(args.bursts):
+        await asyncio.gather(*(start_session() for _ in range(args.burstSize)))
+        await asyncio.sleep(args.gap)
+
+
+async def run(args):
+    server = MockDfxServer(args.host, args.restPort, args.wsPort, rest_delay=args.restDelay)
+    await server.start()
+    metrics = Metrics(quiet=True)
+
+    cold = []
+    rest_obj = RestHandler('token', server.rest_url, pool_size=args.burstSize)
+    await bursts(args, lambda: cold_start(server, rest_obj, metrics, cold))
+    rest_obj.close()
+
+    pooled = []
+    pool = MeasurementPool('token',
+                           server.rest_url,
+                           server.ws_url,
+                           ['studyID'],
+                           size=args.poolSize,
+                           ttl=args.ttl,
+                           num_connections=args.connections,
+                           metrics=metrics)
+    await pool.start()
+    while len(pool.ready['studyID']) < args.poolSize:  # Full, as in a running service
+        await asyncio.sleep(0.01)
+    await bursts(args, lambda: pooled_start(pool, pooled))
+    await pool.close()
+
+    await server.stop()
+    return cold, pooled, pool.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Session setup latency against the mock server: connecting and creating a "
+        "measurement per session versus checking them out of a MeasurementPool")
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--burstSize", help="Sessions starting at once", type=int, default=4)
+    parser.add_argument("--gap", help="Seconds between bursts", type=float, default=0.5)
+    parser.add_argument("--poolSize", help="Measurement IDs kept ready", type=int, default=4)
+    parser.add_argument("--ttl", type=float, default=300.0)
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--restDelay", help="Mock REST round trip in seconds", type=float,
+                        default=0.1)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--restPort", type=int, default=18443)
+    parser.add_argument("--wsPort", type=int, default=18080)
+    args = parser.parse_args()
+
+    cold, pooled, stats = asyncio.run(run(args))
+    for name, latencies in (("connect + create", cold), ("pool checkout", pooled)):
+        print("{:18} p50 {:8.2f} ms  p99 {:8.2f} ms".format(name + ':',
+                                                            percentile(latencies, 50) * 1e3,
+                                                            percentile(latencies, 99) * 1e3))
+    print("pool:              {hits} hits, {misses} misses, {created} created".format(**stats))
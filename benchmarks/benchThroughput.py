@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchUtils import make_payload_dir, percentile  # noqa: E402
+from dfxsnippets.mockServer import MockDfxServer  # noqa: E402
+from dfxsnippets.sessionManager import SessionManager  # noqa: E402
+
+
+def timed(function, latencies, sent):
+    # Wrap a send-and-wait-for-ack coroutine to record the latency and size of each add data
+    async def wrapper(*args, **kwargs):
+        if 'data' in kwargs and not args[0].endswith('/data'):
+            return await function(*args, **kwargs)  # Not an add data request
+        body = kwargs['data'] if 'data' in kwargs else args[-1]
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+            sent.append(len(body))
+
+    return wrapper
+
+
+async def run(args, input_directories):
+    server = MockDfxServer(args.host, args.restPort, args.wsPort, result_delay=args.resultDelay)
+    await server.start()
+
+    sessionmanagerObj = SessionManager('token',
+                                       server.rest_url,
+                                       server.ws_url,
+                                       conn_method=args.connectionMethod,
+                                       num_connections=args.connections,
+                                       max_sessions=args.maxSessions,
+                                       pacing=args.pacing,
+                                       window=args.window)
+    latencies, sent = [], []
+    if args.connectionMethod == 'REST':
+        rest_obj = sessionmanagerObj.rest_obj
+        rest_obj.post_async = timed(rest_obj.post_async, latencies, sent)
+    else:
+        for ws_obj in sessionmanagerObj.ws_objs:
+            ws_obj.handle_request = timed(ws_obj.handle_request, latencies, sent)
+    await sessionmanagerObj.connect()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = await sessionmanagerObj.run('studyID', input_directories)
+    elapsed = time.perf_counter() - start
+
+    await sessionmanagerObj.close()
+    await server.stop()
+    failures = [r for r in results if isinstance(r, Exception)]
+    return elapsed, latencies, sent, server.stats, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end throughput against the mock server")
+    parser.add_argument("--measurements", help="Concurrent measurements", type=int, default=20)
+    parser.add_argument("--chunks", help="Chunks per measurement", type=int, default=5)
+    parser.add_argument("--payloadSize", help="Payload bytes per chunk", type=int, default=200000)
+    parser.add_argument("--duration", help="Chunk duration in seconds", type=float, default=0.0)
+    parser.add_argument("--pacing", choices=["realtime", "ack", "window"], default="realtime")
+    parser.add_argument("--window", help="Chunks in flight with --pacing=window", type=int,
+                        default=4)
+    parser.add_argument("--connectionMethod", choices=["REST", "Websocket"], default="Websocket")
+    parser.add_argument("--connections", help="Websocket connections", type=int, default=1)
+    parser.add_argument("--maxSessions", help="Concurrent measurements", type=int, default=None)
+    parser.add_argument("--resultDelay", help="Mock result delay", type=float, default=0.05)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--restPort", type=int, default=18443)
+    parser.add_argument("--wsPort", type=int, default=18080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The same payload directory is reused by every measurement
+        input_directory = os.path.join(directory, 'payloads')
+        make_payload_dir(input_directory, args.chunks, args.payloadSize, duration=args.duration)
+
+        loop = asyncio.get_event_loop()
+        elapsed, latencies, sent, stats, failures = loop.run_until_complete(
+            run(args, [input_directory] * args.measurements))
+        loop.close()
+
+    print("measurements:     {} ({} failed)".format(args.measurements, len(failures)))
+    print("chunks:           {}".format(len(latencies)))
+    print("results:          {}".format(stats['results']))
+    print("elapsed:          {:.2f} s".format(elapsed))
+    print("chunks/sec:       {:.1f}".format(len(latencies) / elapsed))
+    print("MB/sec:           {:.2f}".format(sum(sent) / elapsed / 1e6))
+    print("ack latency p50:  {:.2f} ms".format(percentile(latencies, 50) * 1e3))
+    print("ack latency p99:  {:.2f} ms".format(percentile(latencies, 99) * 1e3))
+    for failure in failures[:5]:
+        print("failure:", repr(failure))
@@ -0,0 +1,23 @@
+import json
+import os
+
+
+def make_payload_dir(directory, num_chunks, payload_size, duration=5.0):
+    # A synthetic DFX SDK payload directory
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for i in range(num_chunks):
+        with open(os.path.join(directory, 'payload' + str(i) + '.bin'), 'wb') as f:
+            f.write(os.urandom(payload_size))
+        with open(os.path.join(directory, 'metadata' + str(i) + '.bin'), 'w') as f:
+            json.dump({"dfxsdk": "4.3.0"}, f)
+        with open(os.path.join(directory, 'properties' + str(i) + '.json'), 'w') as f:
+            json.dump({"chunk_number": i, "start_time_s": int(duration * i),
+                       "end_time_s": int(duration * (i + 1)), "duration_s": duration}, f)
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
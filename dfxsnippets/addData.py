@@ -1,166 +1,361 @@
 import asyncio
-import base64
-import functools
 import json
-import os
-import requests
-import time
-from glob import glob
 
-from dfxsnippets.adddata_pb2 import DataRequest
+from dfxsnippets.chunkEncoder import (EncodedChunk, as_float32, compress_body,
+                                      encode_rest_body, encode_ws_frame, open_payload,
+                                      set_request_id)
+from dfxsnippets.deadlineScheduler import RealtimePacer
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.payloadIndex import PayloadIndex, chunk_times
+from dfxsnippets.restHelper import RestHandler
 from dfxsnippets.websocketHelper import WebsocketHandler
 
 
+def encode_chunk(conn_method,
+                 measurementID,
+                 files,
+                 i,
+                 num_chunks,
+                 cache=None,
+                 compression=None,
+                 compression_level=None):
+    # Read and encode chunk i; a plain function so that it can also run in a process pool.
+    # With a compression, REST bodies are compressed here too (websocket frames are
+    # compressed by the connection, see WebsocketConfig)
+    if conn_method != 'REST':
+        compression = compression_level = None
+        # A websocket frame is little more than a copy of the payload, reading it back from the
+        # cache is no faster than encoding it again (see benchmarks/benchChunkCache.py)
+        cache = None
+    if cache:
+        key = cache.key(conn_method, files, i, num_chunks, compression, compression_level)
+        chunk = cache.get(key)
+        if chunk:
+            return chunk
+
+    payload_file, meta_file, properties_file = files
+    with open(meta_file, 'r') as input_file:
+        meta = json.load(input_file)
+    with open(properties_file, 'r') as input_file:
+        properties = json.load(input_file)
+    if i == 0 and num_chunks > 1:
+        action = 'FIRST::PROCESS'
+    elif i == num_chunks - 1:
+        action = 'LAST::PROCESS'
+    else:
+        action = 'CHUNK::PROCESS'
+
+    chunkOrder, startTime, endTime, duration = chunk_times(meta, properties)
+
+    # Additional meta fields !
+    meta['Order'] = chunkOrder
+    meta['StartTime'] = startTime
+    meta['EndTime'] = endTime
+
+    payload = open_payload(payload_file)
+    try:
+        if conn_method == 'REST':  # For using REST
+            meta['Duration'] = duration
+            body = encode_rest_body(chunkOrder, action, startTime, endTime, duration,
+                                    json.dumps(meta), payload)
+            if compression:
+                body = compress_body(body, compression, compression_level)
+
+        else:  # For using websockets, a DataRequest protocol buffer in a websocket frame
+            meta['Duration'] = as_float32(duration)
+            body = encode_ws_frame('0506', measurementID, chunkOrder, action, startTime, endTime,
+                                   duration, json.dumps(meta).encode(), payload)
+    finally:
+        if payload:
+            payload.close()
+
+    chunk = EncodedChunk(chunkOrder, action, startTime, endTime, duration, body)
+    if cache:
+        cache.put(key, chunk)
+    return chunk
+
+
 class addData():
-    def __init__(self, measurementID, token, server_url, websocketobj, input_directory):
+    def __init__(self,
+                 measurementID,
+                 token,
+                 server_url,
+                 websocketobj,
+                 input_directory,
+                 preload=False,
+                 restobj=None,
+                 executor=None,
+                 cache=None,
+                 metrics=None,
+                 manifest=None,
+                 ack_timeout=None,
+                 compression=None,
+                 compression_level=None,
+                 encoder=None,
+                 retry_policy=None,
+                 on_ack=None,
+                 scheduler=None):
         self.measurementID = measurementID
         self.token = token
         self.server_url = server_url
         self.input_directory = input_directory
+        self.manifest = manifest  # PayloadIndex of input_directory, made by index_data() if None
+        self.chunk_files = []
         self.chunks = []
+        self.acked = set()  # ChunkOrder of every chunk the server acknowledged
+        self.refused = None  # Status code of the chunk the server refused, None if none was
         self.ws_obj = websocketobj
+        self.rest_obj = None
+        self.executor = executor  # Where aiter_chunks() prepares the chunks, None for the default
+        self.cache = cache  # ChunkCache of encoded chunks, None to always encode them
+        self.encoder = encoder  # EncodingPool preparing the chunks instead of executor
+        self.metrics = metrics if metrics else Metrics()
+        self.ack_timeout = ack_timeout  # Seconds to wait for each chunk's ack, None for ever
+        self.compression = compression  # 'gzip' or 'zstd' to compress REST bodies, None not to
+        self.compression_level = compression_level  # None for the compression's default
+        self.rest_headers = {'Content-Encoding': compression} if compression else None
+        self.retry_policy = retry_policy  # RetryPolicy to pace and retry sends, None for neither
+        self.on_ack = on_ack  # Called with the ChunkOrder of every acknowledged chunk
+        self.scheduler = scheduler  # DeadlineScheduler of realtime pacing, None for the shared one
         if websocketobj:
             self.conn_method = 'Websocket'
         else:
             self.conn_method = 'REST'
-        self.prepare_data()
+            self.rest_obj = restobj if restobj else RestHandler(token, server_url)
+        if input_directory or manifest:  # Without, only chunks passed to sendAsync() are sent
+            self.index_data()
+        if preload:
+            self.prepare_data()
 
     @property
     def num_chunks(self):
-        return len(self.chunks)
+        return len(self.chunk_files)
+
+    def index_data(self):
+        # Raises ValueError if any file is missing or the chunks are out of order
+        if not self.manifest:
+            self.manifest = PayloadIndex(self.input_directory)
+        self.chunk_files = self.manifest.chunk_files
+
+    def prepare_chunk(self, i):
+        return encode_chunk(self.conn_method, self.measurementID, self.chunk_files[i], i,
+                            self.num_chunks, self.cache, self.compression,
+                            self.compression_level)
 
     def prepare_data(self):
-        total_num_payload = len(glob(os.path.join(self.input_directory, 'payload*.bin')))
-        total_num_meta = len(glob(os.path.join(self.input_directory, 'metadata*.bin')))
-        total_num_properties = len(glob(os.path.join(self.input_directory, 'properties*.json')))
-        if total_num_meta != total_num_payload != total_num_properties:
-            raise ValueError('Missing files')
-        for i in range(total_num_payload):
-            with open(os.path.join(self.input_directory, 'payload' + str(i) + '.bin'), 'rb') as input_file:
-                fileContent = input_file.read()
-                payload = fileContent
-            with open(os.path.join(self.input_directory, 'metadata' + str(i) + '.bin'), 'r') as input_file:
-                meta = json.load(input_file)
-            with open(os.path.join(self.input_directory, 'properties' + str(i) + '.json'), 'r') as input_file:
-                properties = json.load(input_file)
-            if i == 0 and total_num_payload > 1:
-                action = 'FIRST::PROCESS'
-            elif i == total_num_payload - 1:
-                action = 'LAST::PROCESS'
+        # Preload every chunk up front (only needed if you want to inspect self.chunks)
+        self.chunks = [self.prepare_chunk(i) for i in range(self.num_chunks)]
+
+    def iter_chunks(self):
+        # Yield the chunks one by one, reading and encoding them only when they are due
+        for i in range(self.num_chunks):
+            if self.chunks:
+                yield self.chunks[i]
+            else:
+                yield self.prepare_chunk(i)
+
+    async def aiter_chunks(self):
+        # Same as iter_chunks() but the file reads and encoding run in self.executor (a thread
+        # or process pool)
+        if self.encoder and not self.chunks:
+            async for chunk in self.encoder.encode_chunks(self.conn_method, self.measurementID,
+                                                          self.chunk_files, self.cache,
+                                                          self.compression,
+                                                          self.compression_level, self.metrics):
+                yield chunk
+            return
+        loop = asyncio.get_event_loop()
+        for i in range(self.num_chunks):
+            if self.chunks:
+                yield self.chunks[i]
+            else:
+                self.metrics.event('prepare', self.measurementID, i)
+                chunk = await loop.run_in_executor(self.executor, encode_chunk, self.conn_method,
+                                                   self.measurementID, self.chunk_files[i], i,
+                                                   self.num_chunks, self.cache, self.compression,
+                                                   self.compression_level)
+                self.metrics.event('encoded', self.measurementID, i)
+                yield chunk
+
+    async def follow_chunks(self, tail):
+        # Same as aiter_chunks() for a payload directory the DFX SDK is still writing: each
+        # chunk of tail (a PayloadTail) as soon as its files are complete. chunk_files grows
+        # as the chunks come
+        loop = asyncio.get_event_loop()
+        async for i, files, last in tail.aiter_files():
+            self.chunk_files.append(files)
+            # encode_chunk() takes the action from the number of chunks: i + 1 makes chunk i
+            # the LAST, any more a FIRST or CHUNK
+            num_chunks = i + 1 if last else i + 2
+            self.metrics.event('prepare', self.measurementID, i)
+            chunk = await loop.run_in_executor(self.executor, encode_chunk, self.conn_method,
+                                               self.measurementID, files, i, num_chunks,
+                                               self.cache, self.compression,
+                                               self.compression_level)
+            self.metrics.event('encoded', self.measurementID, i)
+            yield chunk
+
+    def handle_ack(self, chunk, status_code, ackOrder, body):
+        self.metrics.log("*" * 10)
+        self.metrics.log("addData response code: ", status_code)
+        self.metrics.log("addData response body: ", body)
+        self.metrics.log("*" * 10)
+        if status_code != '200':
+            self.metrics.event('error', self.measurementID, chunk.ChunkOrder)
+            self.refused = status_code
+            self.metrics.log("Error adding data. Please check your inputs.")
+            return False
+        if ackOrder != chunk.ChunkOrder:
+            self.metrics.event('error', self.measurementID, chunk.ChunkOrder)
+            self.metrics.log("Acknowledged chunk", ackOrder, "while waiting for chunk",
+                             chunk.ChunkOrder)
+            return False
+        self.metrics.event('ack', self.measurementID, chunk.ChunkOrder)
+        self.acked.add(ackOrder)
+        if self.on_ack:
+            self.on_ack(ackOrder)
+        return True
+
+    def send_chunk_sync(self, chunk):
+        path = "/measurements/" + self.measurementID + "/data"
+        self.metrics.event('send', self.measurementID, chunk.ChunkOrder, len(chunk.Body))
+        response = self.rest_obj.post(path, data=chunk.Body, headers=self.rest_headers)
+        body = response.json()
+        return self.handle_ack(chunk, str(response.status_code),
+                               body.get("ChunkOrder", chunk.ChunkOrder), body)
+
+    async def send_chunk(self, chunk):
+        # Send chunk until it is acknowledged or refused. With a retry_policy, every send waits
+        # for the rate limit and a throttled or failed one is sent again after a backoff
+        if chunk.ChunkOrder in self.acked:  # Never send an acknowledged chunk twice
+            return True
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            if policy:
+                await policy.acquire()
+            if self.conn_method == 'REST':
+                status_code, ackOrder, body, retry_after = await self.send_rest(chunk)
             else:
-                action = 'CHUNK::PROCESS'
+                status_code, ackOrder, body, retry_after = await self.send_ws(chunk)
+            if policy:
+                policy.on_response(status_code)
+                if status_code != '200' and policy.should_retry(status_code, attempt):
+                    delay = policy.backoff(attempt, retry_after)
+                    self.metrics.event('retry', self.measurementID, chunk.ChunkOrder)
+                    self.metrics.log("Chunk", chunk.ChunkOrder, "got", status_code,
+                                     "sending again in {:.2f}s".format(delay))
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+            return self.handle_ack(chunk, status_code, ackOrder, body)
 
+    async def send_rest(self, chunk):
+        # Returns the status code, acknowledged ChunkOrder, body and Retry-After of one send;
+        # a status code of None if there was no response (and a retry_policy to retry it)
+        path = "/measurements/" + self.measurementID + "/data"
+        self.metrics.event('send', self.measurementID, chunk.ChunkOrder, len(chunk.Body))
+        try:
+            response = await self.rest_obj.post_async(path,
+                                                      data=chunk.Body,
+                                                      headers=self.rest_headers)
+        except OSError as e:  # requests' ConnectionError and Timeout are OSErrors
+            if not self.retry_policy:
+                raise
+            return None, chunk.ChunkOrder, repr(e), None
+        try:
+            body = response.json()
+        except ValueError:  # e.g. a proxy's error page
+            body = {}
+        return (str(response.status_code), body.get("ChunkOrder", chunk.ChunkOrder), body,
+                self.retry_policy.retry_after(response) if self.retry_policy else None)
+
+    async def send_ws(self, chunk):
+        # Same as send_rest(), over the websocket
+        while True:
+            requestID = self.ws_obj.new_request_id()
+            set_request_id(chunk.Body, requestID)  # Fill in the blank request ID of the frame
+            self.metrics.event('send', self.measurementID, chunk.ChunkOrder, len(chunk.Body))
             try:
-                if (meta["dfxsdk"] < "4.0"):
-                    chunkOrder = properties['chunkNumber']
-                    startTime = properties['startTime_s']
-                    endTime = properties['endTime_s']
-                else:
-                    chunkOrder = properties['chunk_number']
-                    startTime = properties['start_time_s']
-                    endTime = properties['end_time_s']
-            except:
-                chunkOrder = properties['chunk_number']
-                startTime = properties['start_time_s']
-                endTime = properties['end_time_s']
-            duration = properties['duration_s']
-
-            if self.conn_method == 'REST':  # For using REST
-                data = {}
-                data["ChunkOrder"] = chunkOrder
-                data["Action"] = action
-                data["StartTime"] = startTime
-                data["EndTime"] = endTime
-                data["Duration"] = duration
-                # Additional meta fields !
-                meta['Order'] = chunkOrder
-                meta['StartTime'] = startTime
-                meta['EndTime'] = endTime
-                meta['Duration'] = duration
-
-                data['Meta'] = json.dumps(meta)
-                data["Payload"] = base64.b64encode(payload).decode('utf-8')
-
-            else:  # For using websockets
-                data = DataRequest()  # Reconfigure each chunk into a protocol buffer
-                paramval = data.Params
-                paramval.ID = self.measurementID
-
-                data.ChunkOrder = chunkOrder
-                data.Action = action
-                data.StartTime = startTime
-                data.EndTime = endTime
-                data.Duration = duration
-                # Additional meta fields !
-                meta['Order'] = chunkOrder
-                meta['StartTime'] = startTime
-                meta['EndTime'] = endTime
-                meta['Duration'] = data.Duration
-
-                data.Meta = json.dumps(meta).encode()
-                data.Payload = bytes(payload)
-
-            self.chunks.append(data)
-
-    def sendSync(self):
-        if self.conn_method == 'REST':
-            url = self.server_url + "/measurements/" + self.measurementID + "/data"
-            headers = dict(Authorization="Bearer {}".format(self.token))
-            headers['Content-Type'] = "application/json"
-            for chunk in self.chunks:
-                response = requests.post(url, json=chunk, headers=headers)
-                print("*" * 10)
-                print("addData response code: ", response.status_code)
-                print("addData response body: ", response.json())
-                print("*" * 10)
-                if "LAST" not in chunk['Action']:
-                    print("sleep for the chunk duration")
-                    time.sleep(chunk['Duration'])
-
-    async def sendAsync(self):
-        if self.conn_method == 'REST':
-            url = self.server_url + "/measurements/" + self.measurementID + "/data"
-            headers = dict(Authorization="Bearer {}".format(self.token))
-            headers['Content-Type'] = "application/json"
-            for chunk in self.chunks:
-                requestFunction = functools.partial(requests.post, url=url, json=chunk, headers=headers)
-                loop = asyncio.get_event_loop()
-                future = loop.run_in_executor(None, requestFunction)
-                response = await future
-                print("*" * 10)
-                print("addData response code: ", response.status_code)
-                print("addData response body: ", response.json())
-                print("*" * 10)
-                if "LAST" not in chunk['Action']:
-                    print("sleep for the chunk duration")
-                    await asyncio.sleep(chunk['Duration'])
+                response = await self.ws_obj.handle_request(requestID,
+                                                            chunk.Body,
+                                                            stream=self.measurementID)
+                break
+            except ConnectionError:
+                # Lost with the connection; send it again once the WebsocketHandler reconnects
+                if not await self.ws_obj.wait_connected():
+                    raise
+                self.metrics.log("Sending chunk", chunk.ChunkOrder, "again after reconnecting")
+        from dfxsnippets.adddata_pb2 import DataResponse  # Only needed for websockets
 
-        else:
-            actionID = '0506'
-            wsID = self.ws_obj.ws_ID
-            for chunk in self.chunks:
-                content = f'{actionID:4}{wsID:10}'.encode() + chunk.SerializeToString()
-                await self.ws_obj.handle_send(content)
-                while True:
-                    try:
-                        await asyncio.wait_for(self.ws_obj.handle_recieve(), timeout=2)
-                    except TimeoutError:
-                        break
-                    if self.ws_obj.addDataStats:
-                        response = self.ws_obj.addDataStats[0]
-                        self.ws_obj.addDataStats = []
-                        break
-                status_code = response[10:13].decode('utf-8')
-                print("*" * 10)
-                print("addData response code: ", status_code)
-                print("addData response body: ", response)
-                print("*" * 10)
-                if status_code != '200':
-                    print("Error adding data. Please check your inputs.")
+        _, status_code, body = self.ws_obj.parse_response(response)
+        dataResponse = DataResponse()
+        if status_code == '200':
+            dataResponse.ParseFromString(bytes(body))
+        return status_code, dataResponse.ChunkOrder, response, None
+
+    def sendSync(self, pacing='realtime'):
+        # pacing: 'realtime' sends every chunk at its StartTime after the first one, 'ack' sends
+        # the next chunk as soon as the previous one is acknowledged
+        pacer = RealtimePacer() if pacing == 'realtime' else None
+        if self.conn_method == 'REST':
+            for chunk in self.iter_chunks():
+                if pacer:
+                    pacer.wait_sync(chunk)
+                if not self.send_chunk_sync(chunk):
                     return
-                if "LAST" not in chunk.Action:
-                    print("sleep for the chunk duration")
-                    await asyncio.sleep(chunk.Duration)
+
+    async def sendAsync(self, pacing='realtime', window=1, chunks=None):
+        # pacing: 'realtime' sends every chunk at its StartTime after the first one, 'ack' sends
+        # the next chunk as soon as the previous one is acknowledged, 'window' keeps up to
+        # `window` unacknowledged chunks in flight. chunks is an async iterable of
+        # EncodedChunk, the chunks of input_directory if None. Returns whether every chunk
+        # was acknowledged
+        if pacing != 'window':
+            window = 1
+        pacer = RealtimePacer(self.scheduler) if pacing == 'realtime' else None
+        in_flight = set()
+        acked_all = False
+        try:
+            async for chunk in (self.aiter_chunks() if chunks is None else chunks):
+                if chunk.ChunkOrder in self.acked:  # Resuming, the server already has this chunk
+                    continue
+                # The LAST chunk only goes out once every chunk before it is acknowledged
+                limit = 0 if "LAST" in chunk.Action else window - 1
+                in_flight, ok = await self.wait_in_flight(in_flight, limit)
+                if not ok:
+                    return False
+                if pacer:
+                    await pacer.wait(chunk)
+
+                in_flight.add(
+                    asyncio.ensure_future(asyncio.wait_for(self.send_chunk(chunk),
+                                                           self.ack_timeout)))
+                self.metrics.gauge('chunks_in_flight', len(in_flight))
+
+                # Nothing else goes out before the FIRST chunk is acknowledged
+                if window == 1 or "FIRST" in chunk.Action:
+                    in_flight, ok = await self.wait_in_flight(in_flight, 0)
+                    if not ok:
+                        return False
+            in_flight, ok = await self.wait_in_flight(in_flight, 0)
+            acked_all = ok
+            return ok
+        finally:
+            # Cancelled, or a chunk failed or timed out: nothing is left sending in the background
+            for task in in_flight:
+                task.cancel()
+            if not acked_all:  # Refused, timed out or cancelled: its spans won't end
+                self.metrics.discard(self.measurementID)
+
+    async def wait_in_flight(self, in_flight, limit):
+        # Wait until at most `limit` chunks are unacknowledged; on an error, wait for all of
+        # them and report it
+        ok = True
+        while in_flight and (len(in_flight) > limit or not ok):
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            ok = all([task.result() for task in done]) and ok
+        return in_flight, ok
 
 
 if __name__ == '__main__':
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+
+from dfxsnippets.encodingPool import EncodingPool
+from dfxsnippets.payloadIndex import PayloadIndex
+from dfxsnippets.sessionManager import SessionManager
+
+
+class BulkIngest():
+    def __init__(self,
+                 token,
+                 rest_url,
+                 ws_url,
+                 progress_file,
+                 workers=None,
+                 prefetch=None,
+                 **session_options):
+        self.progress_file = progress_file
+        self.workers = workers  # Processes preparing chunks, None for one per CPU
+        self.prefetch = prefetch  # Chunks of a measurement prepared ahead, None for workers
+        self.session_options = session_options  # Handed to the SessionManager
+        self.token = token
+        self.rest_url = rest_url
+        self.ws_url = ws_url
+        self.done = {}  # payload directory -> measurementID, for every finished measurement
+        self.load_progress()
+
+    @staticmethod
+    def discover(root):
+        # Every directory under root holding DFX SDK payload files
+        found = []
+        for directory, _, files in os.walk(root):
+            if any(f.startswith('payload') and f.endswith('.bin') for f in files):
+                found.append(os.path.normpath(directory))
+        return sorted(found)
+
+    def load_progress(self):
+        # The progress file has one JSON line per finished (or failed) measurement
+        if not os.path.isfile(self.progress_file):
+            return
+        with open(self.progress_file) as progress:
+            for line in progress:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # A line cut short by a crash
+                    continue
+                if entry.get("Status") == "done":
+                    self.done[entry["PayloadDir"]] = entry["MeasurementID"]
+
+    def record_progress(self, input_directory, measurementID, status, error=None):
+        entry = dict(PayloadDir=input_directory, MeasurementID=measurementID, Status=status)
+        if error:
+            entry["Error"] = repr(error)
+        with open(self.progress_file, 'a') as progress:
+            progress.write(json.dumps(entry) + '\n')
+            progress.flush()
+            os.fsync(progress.fileno())
+        if status == "done":
+            self.done[input_directory] = measurementID
+
+    async def run(self, studyID, root, output_directory=None, max_sessions=10):
+        input_directories = [d for d in self.discover(root) if d not in self.done]
+        print("Ingesting", len(input_directories), "payload directories,", len(self.done),
+              "already done")
+
+        # Check every directory up front, from the file names and properties alone, so a
+        # broken directory fails before any measurement is made
+        valid, skipped = [], []
+        for input_directory in input_directories:
+            try:
+                PayloadIndex(input_directory)
+            except (ValueError, KeyError, OSError) as e:
+                print("Skipping", input_directory, ":", e)
+                self.record_progress(input_directory, None, "failed", e)
+                skipped.append(e)
+                continue
+            valid.append(input_directory)
+
+        # File reads, JSON parsing and protobuf encoding go to the process pool, several
+        # chunks ahead, and come back through shared memory; the network I/O of every
+        # measurement stays on this event loop
+        with EncodingPool(self.workers, self.prefetch) as encoder:
+            sessionmanagerObj = SessionManager(self.token,
+                                               self.rest_url,
+                                               self.ws_url,
+                                               max_sessions=max_sessions,
+                                               encoder=encoder,
+                                               **self.session_options)
+            await sessionmanagerObj.connect()
+            semaphore = asyncio.Semaphore(max_sessions)
+
+            async def ingest_one(input_directory):
+                out_folder = None
+                if output_directory:
+                    out_folder = os.path.join(output_directory,
+                                              os.path.relpath(input_directory, root))
+                    os.makedirs(out_folder, exist_ok=True)
+                async with semaphore:
+                    try:
+                        # Only returns once every chunk was acknowledged and every result
+                        # received; a refused chunk raises ValueError, and a lost ack or
+                        # result asyncio.TimeoutError, so the slot is freed either way
+                        measurementID = await sessionmanagerObj.run_measurement(
+                            studyID, input_directory, out_folder)
+                    except Exception as e:
+                        self.record_progress(input_directory, None, "failed", e)
+                        return e
+                self.record_progress(input_directory, measurementID, "done")
+                return measurementID
+
+            try:
+                return skipped + await asyncio.gather(*(ingest_one(d) for d in valid))
+            finally:
+                await sessionmanagerObj.close()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from dfxsnippets.chunkEncoder import EncodedChunk
+
+# Bump this whenever the way chunks are encoded changes, so old cache entries are never used
+CACHE_VERSION = 1
+
+
+class ChunkCache():
+    # Encoded chunks on disk, so that replaying the same payload directory again skips reading
+    # the meta and properties files and encoding the chunks.
+    # Each entry is one file named by the hash of its key: a JSON line with the EncodedChunk
+    # fields, followed by the encoded body.
+    def __init__(self, cache_dir, max_bytes=2**30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes  # The least recently used entries are evicted above this
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self.scan())
+        self.stats = dict(hits=0, misses=0, evictions=0)
+
+    def scan(self):
+        return [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.chunk')]
+
+    @staticmethod
+    def key(conn_method, files, i, num_chunks, compression=None, compression_level=None):
+        # Identifies the files by path, size and modification time, so a changed file is
+        # never served from the cache, without having to read the files to hash them
+        stats = []
+        for path in files:
+            st = os.stat(path)
+            stats.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+        key = [CACHE_VERSION, conn_method, stats, i, num_chunks]
+        if compression:  # Uncompressed chunks keep the keys they always had
+            key += [compression, compression_level]
+        key = json.dumps(key)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.chunk')
+
+    def get(self, key):
+        # The cached chunk, or None if it isn't cached
+        path = self.path(key)
+        try:
+            cache_file = open(path, 'rb')
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return None
+        with cache_file:
+            fields = json.loads(cache_file.readline())
+            body = cache_file.read()  # Bytes, as REST bodies must be
+        try:
+            os.utime(path)  # Most recently used
+        except FileNotFoundError:  # Evicted meanwhile by another process
+            pass
+        self.stats['hits'] += 1
+        return EncodedChunk(*fields, body)
+
+    def put(self, key, chunk):
+        path = self.path(key)
+        # A temporary file of its own, even with other threads or processes storing the same key
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with open(fd, 'wb') as cache_file:
+                cache_file.write(json.dumps(list(chunk[:-1])).encode() + b'\n')
+                cache_file.write(chunk.Body)
+                size = cache_file.tell()
+            try:  # An entry stored again replaces the old one, its size no longer counts
+                size -= os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)  # Atomic, nobody ever reads a half written entry
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.size += size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Remove the least recently used entries until the cache fits in max_bytes. The
+        # directory is scanned again, since other processes may share the cache
+        entries = sorted(self.scan(), key=lambda entry: entry.stat().st_mtime_ns)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self.size -= size
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        for entry in self.scan():
+            os.remove(entry.path)
+        self.size = 0
@@ -0,0 +1,148 @@
+import binascii
+import gzip
+import json
+import mmap
+import struct
+from collections import namedtuple
+
+# An encoded chunk: the DataRequest fields needed for scheduling, plus Body, the bytes sent on
+# the wire (a complete websocket frame, or a REST request body)
+EncodedChunk = namedtuple('EncodedChunk',
+                          ['ChunkOrder', 'Action', 'StartTime', 'EndTime', 'Duration', 'Body'])
+
+# Websocket frames start with Buffer( [ string:4 route ][ string:10 requestID ] )
+WS_HEADER_SIZE = 14
+
+# DataRequest (adddata_pb2) field tags, i.e. (field number << 3) | wire type
+_TAG_PARAMS = 0x0a
+_TAG_PARAMS_ID = 0x0a
+_TAG_ACTION = 0x12
+_TAG_CHUNK_ORDER = 0x18
+_TAG_START_TIME = 0x20
+_TAG_END_TIME = 0x28
+_TAG_DURATION = 0x35
+_TAG_PAYLOAD = 0x3a
+_TAG_META = 0x42
+
+
+def open_payload(path):
+    # Memory-map the payload so its bytes are only copied once, into the outgoing buffer
+    with open(path, 'rb') as input_file:
+        try:
+            return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files can't be mapped
+            return b''
+
+
+def as_float32(value):
+    # The value a protobuf float field holds after assigning value to it
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _length_delimited(tag, size):
+    return bytes([tag]) + _varint(size)
+
+
+def encode_ws_header(actionID, measurementID):
+    # Buffer( [ string:4 ][ string:10 ] ) with a blank request ID, followed by
+    # DataRequest.Params, the first field of the DataRequest and the only one that depends on
+    # the measurement
+    measurementID = measurementID.encode()
+    params = b''
+    if measurementID:
+        params = _length_delimited(_TAG_PARAMS_ID, len(measurementID)) + measurementID
+    return b''.join((f'{actionID:4}'.encode(), b' ' * (WS_HEADER_SIZE - 4),
+                     _length_delimited(_TAG_PARAMS, len(params)), params))
+
+
+def encode_ws_frame(actionID, measurementID, chunkOrder, action, startTime, endTime, duration,
+                    meta, payload):
+    # Build Buffer( [ string:4 ][ string:10 ][ DataRequest ] ) in one preallocated buffer.
+    # The request ID is left blank, fill it in with set_request_id() just before sending.
+    # Fields are written in field number order and proto3 defaults are skipped, exactly
+    # like DataRequest.SerializeToString() does.
+    action = action.encode()
+
+    head = [encode_ws_header(actionID, measurementID)]
+    if action:
+        head += [_length_delimited(_TAG_ACTION, len(action)), action]
+    if chunkOrder:
+        head += [bytes([_TAG_CHUNK_ORDER]), _varint(chunkOrder)]
+    if startTime:
+        head += [bytes([_TAG_START_TIME]), _varint(startTime)]
+    if endTime:
+        head += [bytes([_TAG_END_TIME]), _varint(endTime)]
+    if duration:
+        head += [bytes([_TAG_DURATION]), struct.pack('<f', duration)]
+    if len(payload):
+        head.append(_length_delimited(_TAG_PAYLOAD, len(payload)))
+    tail = [_length_delimited(_TAG_META, len(meta)), meta] if meta else []
+
+    head = b''.join(head)
+    tail = b''.join(tail)
+    frame = bytearray(len(head) + len(payload) + len(tail))
+    view = memoryview(frame)
+    pos = 0
+    view[pos:pos + len(head)] = head
+    pos += len(head)
+    with memoryview(payload) as payload_view:
+        view[pos:pos + len(payload)] = payload_view
+    pos += len(payload)
+    view[pos:] = tail
+    view.release()
+    return frame
+
+
+def set_request_id(frame, requestID):
+    frame[4:WS_HEADER_SIZE] = f'{requestID:10}'.encode()
+
+
+def encode_rest_body(chunkOrder, action, startTime, endTime, duration, meta, payload):
+    # The same JSON as requests.post(json=data) with data['Payload'] base64 encoded, but the
+    # base64 is written straight into the body instead of going through a str and json.dumps
+    data = {}
+    data["ChunkOrder"] = chunkOrder
+    data["Action"] = action
+    data["StartTime"] = startTime
+    data["EndTime"] = endTime
+    data["Duration"] = duration
+    data['Meta'] = meta
+    data["Payload"] = ""
+    head = json.dumps(data)[:-2].encode()  # Up to and including the opening quote of Payload
+    with memoryview(payload) as view:
+        encoded = binascii.b2a_base64(view, newline=False)
+    # Must be bytes, requests would treat a bytearray or memoryview as a stream
+    return b''.join((head, encoded, b'"}'))
+
+
+def compress_body(body, encoding, level=None):
+    # A REST request body compressed for a Content-Encoding of encoding ('gzip' or 'zstd');
+    # level None is the encoding's usual default
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6 if level is None else level, mtime=0)
+    if encoding == 'zstd':
+        import zstandard  # Optional, only needed for zstd
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(body)
+    raise ValueError(' Unknown compression {}'.format(encoding))
+
+
+def decompress_body(body, encoding):
+    # The other way round, for a body received with a Content-Encoding of encoding
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd':
+        import zstandard  # Optional, only needed for zstd
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(' Unknown compression {}'.format(encoding))
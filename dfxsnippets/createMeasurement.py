@@ -1,33 +1,80 @@
+import asyncio
 import json
-import requests
+
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.restHelper import RestHandler
 
 
 class createMeasurement():
-    def __init__(self, studyID, token, rest_url, resolution=0):
+    def __init__(self,
+                 studyID,
+                 token,
+                 rest_url,
+                 resolution=0,
+                 restobj=None,
+                 metrics=None,
+                 retry_policy=None):
         self.studyID = studyID
         self.token = token
         self.rest_url = rest_url
         self.resolution = resolution
+        self.rest_obj = restobj if restobj else RestHandler(token, rest_url)
+        self.metrics = metrics if metrics else Metrics()
+        self.retry_policy = retry_policy  # RetryPolicy to pace and retry creates, None for neither
 
-    def create(self):
-        url = self.rest_url + "/measurements"
+    def prepare_data(self):
         data = {}
         data["StudyID"] = self.studyID
         data["Action"] = self.token
         data["Resolution"] = self.resolution
+        return json.dumps(data)
 
-        headers = dict(Authorization="Bearer {}".format(self.token))
-        headers['Content-Type'] = "application/json"
+    def create(self):
         try:
-            response = requests.post(url, data=json.dumps(data), headers=headers)
+            response = self.rest_obj.post("/measurements", data=self.prepare_data())
         except:
             raise ValueError(' Cannot create measurement on server')
-        print("*" * 10)
-        print("createMeasurement response code: ", response.status_code)
-        print("createMeasurement response body: ", response.json())
-        print("*" * 10)
+        return self.handle_response(response)
+
+    async def createAsync(self):
+        # With a retry_policy, only a throttled create, or one without a response, is sent
+        # again: after any other error the server may already have made the measurement
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            if policy:
+                await policy.acquire()
+            try:
+                response = await self.rest_obj.post_async("/measurements",
+                                                          data=self.prepare_data())
+                status_code = str(response.status_code)
+            except Exception:
+                if not policy:
+                    raise ValueError(' Cannot create measurement on server')
+                response = status_code = None
+            if not policy:
+                break
+            policy.on_response(status_code)
+            if status_code == '200' or not policy.should_retry(
+                    status_code, attempt, policy.throttle_statuses):
+                break
+            delay = policy.backoff(attempt, policy.retry_after(response))
+            self.metrics.log("createMeasurement got", status_code,
+                             "creating again in {:.2f}s".format(delay))
+            await asyncio.sleep(delay)
+            attempt += 1
+        if response is None:
+            raise ValueError(' Cannot create measurement on server')
+        return self.handle_response(response)
+
+    def handle_response(self, response):
+        self.metrics.log("*" * 10)
+        self.metrics.log("createMeasurement response code: ", response.status_code)
+        self.metrics.log("createMeasurement response body: ", response.json())
+        self.metrics.log("*" * 10)
         try:
             measurementID = response.json()['ID']
+            self.metrics.event('created', measurementID)
             return measurementID
         except:
             raise ValueError(' Cannot create measurement on server')
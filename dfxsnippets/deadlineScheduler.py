@@ -0,0 +1,95 @@
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+
+_schedulers = weakref.WeakKeyDictionary()  # event loop -> its shared DeadlineScheduler
+
+
+def shared_scheduler():
+    # The DeadlineScheduler shared by every measurement of the running event loop
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = DeadlineScheduler()
+    return scheduler
+
+
+class DeadlineScheduler():
+    # Wakes up coroutines waiting for a deadline on the event loop's monotonic clock, with one
+    # heap of deadlines and a single timer on the loop for the earliest one, however many
+    # measurements are waiting. Deadlines less than `resolution` seconds apart are released by
+    # the same wake-up. Use one per event loop, see shared_scheduler().
+    def __init__(self, resolution=0.001):
+        self.resolution = resolution
+        self.heap = []  # (deadline, sequence number, future) of every waiting coroutine
+        self.sequence = itertools.count()  # Orders the waiters of the same deadline
+        self.loop = None
+        self.timer = None  # TimerHandle of the loop for the earliest deadline
+        self.timer_at = None
+        self.stats = dict(waits=0, wakeups=0, max_late=0.0)
+
+    async def wait_until(self, deadline):
+        # Return at deadline, in loop.time() seconds; straight away if it has passed
+        loop = asyncio.get_running_loop()
+        if deadline <= loop.time():
+            return
+        if loop is not self.loop:  # Only ever used by one loop at a time
+            self.loop, self.heap, self.timer, self.timer_at = loop, [], None, None
+        future = loop.create_future()
+        heapq.heappush(self.heap, (deadline, next(self.sequence), future))
+        self.stats['waits'] += 1
+        if self.timer_at is None or deadline < self.timer_at:
+            self.arm()
+        await future  # A cancelled waiter is left in the heap and skipped when it is due
+
+    def arm(self):
+        if self.timer:
+            self.timer.cancel()
+        self.timer_at = self.heap[0][0]
+        self.timer = self.loop.call_at(self.timer_at, self.release)
+
+    def release(self):
+        # Wake up every waiter whose deadline is due, and set the timer for the next one
+        self.timer = self.timer_at = None
+        now = self.loop.time()
+        self.stats['wakeups'] += 1
+        while self.heap and self.heap[0][0] <= now + self.resolution:
+            deadline, _, future = heapq.heappop(self.heap)
+            if not future.done():
+                future.set_result(None)
+                self.stats['max_late'] = max(self.stats['max_late'], now - deadline)
+        if self.heap:
+            self.arm()
+
+
+class RealtimePacer():
+    # Releases the chunks of one measurement at the pace they were captured: the first chunk
+    # straight away and every later one at its StartTime after it, on a monotonic clock, but
+    # never before the Duration of the previous chunk has passed since its deadline (the API
+    # doesn't take a chunk any sooner). How long sending and acknowledging each chunk took
+    # doesn't add up, unlike sleeping for the chunk duration after every acknowledgement. A
+    # chunk that is already late goes at once.
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler  # DeadlineScheduler, the shared_scheduler() if None
+        self.origin = None  # (clock time, StartTime) of the first chunk
+        self.earliest = None  # Deadline of the previous chunk plus its Duration
+
+    def deadline(self, chunk, now):
+        if self.origin is None:
+            self.origin = (now, chunk.StartTime)
+        deadline = self.origin[0] + chunk.StartTime - self.origin[1]
+        if self.earliest is not None:
+            deadline = max(deadline, self.earliest)
+        self.earliest = deadline + chunk.Duration
+        return deadline
+
+    async def wait(self, chunk):
+        scheduler = self.scheduler if self.scheduler else shared_scheduler()
+        await scheduler.wait_until(self.deadline(chunk, asyncio.get_running_loop().time()))
+
+    def wait_sync(self, chunk):
+        delay = self.deadline(chunk, time.monotonic()) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
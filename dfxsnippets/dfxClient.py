@@ -0,0 +1,247 @@
+import asyncio
+
+from dfxsnippets.addData import addData
+from dfxsnippets.createMeasurement import createMeasurement
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.payloadIndex import PayloadIndex
+from dfxsnippets.payloadTail import PayloadTail
+from dfxsnippets.restHelper import RestHandler
+from dfxsnippets.resultDecoder import DecodeSink
+from dfxsnippets.resultSink import ContainerSink, FileSink
+from dfxsnippets.subscribeResults import subscribeResults
+from dfxsnippets.websocketHelper import WebsocketHandler
+
+
+async def supervise(*coros):
+    # Run coros (or tasks) together and return their results. If one of them fails, or this is
+    # cancelled, the others are cancelled too, and waited for, before this returns
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class DfxClient():
+    # Everything needed for measurements, for use inside a running event loop:
+    #
+    #   async with DfxClient(token, rest_url, ws_url) as client:
+    #       measurementID = await client.measure(studyID, input_directory)
+    #
+    # Nothing in here blocks the loop, every wait for the server has a timeout (unless it is
+    # set to None), and every task it starts is cancelled when the client is closed (or the
+    # caller is cancelled).
+    def __init__(self,
+                 token,
+                 rest_url,
+                 ws_url,
+                 conn_method='Websocket',
+                 rest_pool_size=10,
+                 executor=None,
+                 cache=None,
+                 metrics=None,
+                 config=None,
+                 connect_timeout=10.0,
+                 request_timeout=30.0,
+                 result_timeout=120.0,
+                 compression=None,
+                 compression_level=None,
+                 retry_policy=None):
+        self.token = token
+        self.rest_url = rest_url
+        self.ws_url = ws_url
+        self.conn_method = conn_method  # For add data; results always come over the websocket
+        self.rest_pool_size = rest_pool_size
+        self.executor = executor  # Where addData prepares the chunks, None for the default
+        self.cache = cache  # ChunkCache shared by every addData
+        self.metrics = metrics if metrics else Metrics()
+        self.config = config  # WebsocketConfig
+        self.connect_timeout = connect_timeout  # Seconds to connect the websocket
+        self.request_timeout = request_timeout  # Seconds to create a measurement or ack a chunk
+        self.result_timeout = result_timeout  # Seconds to wait for each result, None for ever
+        self.compression = compression  # 'gzip' or 'zstd' for REST bodies, see addData
+        self.compression_level = compression_level
+        self.retry_policy = retry_policy  # RetryPolicy for creates and chunks, see addData
+        self.rest_obj = None
+        self.ws_obj = None
+        self.tasks = set()  # Every task started by spawn() that is still running
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def connect(self):
+        # Raises asyncio.TimeoutError or OSError if the websocket can't be connected
+        self.rest_obj = RestHandler(self.token, self.rest_url, pool_size=self.rest_pool_size)
+        self.ws_obj = WebsocketHandler(self.token,
+                                       self.ws_url,
+                                       config=self.config,
+                                       metrics=self.metrics)
+        try:
+            await asyncio.wait_for(self.ws_obj.connect_ws(), self.connect_timeout)
+        except BaseException:
+            self.rest_obj.close()
+            raise
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.ws_obj and self.ws_obj.ws:
+            await self.ws_obj.handle_close()
+        if self.rest_obj:
+            self.rest_obj.close()
+
+    def spawn(self, coro):
+        # Start coro as a task that close() cancels if it is still running
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def supervise(self, *coros):
+        # supervise() with tasks that close() cancels too
+        return await supervise(*(self.spawn(coro) for coro in coros))
+
+    async def create_measurement(self, studyID, resolution=0):
+        createmeasurementObj = createMeasurement(studyID,
+                                                 self.token,
+                                                 self.rest_url,
+                                                 resolution=resolution,
+                                                 restobj=self.rest_obj,
+                                                 metrics=self.metrics,
+                                                 retry_policy=self.retry_policy)
+        return await asyncio.wait_for(createmeasurementObj.createAsync(), self.request_timeout)
+
+    def make_adddata(self, measurementID, input_directory=None, manifest=None):
+        return addData(measurementID,
+                       self.token,
+                       self.rest_url,
+                       self.ws_obj if self.conn_method == 'Websocket' else None,
+                       input_directory,
+                       restobj=self.rest_obj,
+                       executor=self.executor,
+                       cache=self.cache,
+                       metrics=self.metrics,
+                       manifest=manifest,
+                       ack_timeout=self.request_timeout,
+                       compression=self.compression,
+                       compression_level=self.compression_level,
+                       retry_policy=self.retry_policy)
+
+    def read_chunks(self, measurementID, input_directory, manifest=None):
+        # An async iterator of the encoded chunks of a payload directory, for add_data()
+        return self.make_adddata(measurementID, input_directory, manifest).aiter_chunks()
+
+    def follow_chunks(self, measurementID, input_directory, **tail_options):
+        # Same as read_chunks() for a payload directory the DFX SDK is still writing, until it
+        # writes the end marker; tail_options are handed to the PayloadTail
+        tail = PayloadTail(input_directory, **tail_options)
+        return self.make_adddata(measurementID).follow_chunks(tail)
+
+    async def add_data(self, measurementID, chunks, pacing='ack', window=1):
+        # Send every EncodedChunk of the async iterable chunks, e.g. read_chunks(); raises
+        # ValueError if one isn't acknowledged
+        adddataObj = self.make_adddata(measurementID)
+        if not await adddataObj.sendAsync(pacing, window, chunks=chunks):
+            raise ValueError(' Cannot add data to measurement {}'.format(measurementID))
+
+    def results(self, measurementID, num_chunks=None, decoder=None):
+        # An async iterator of (counter, body) for every result of the measurement, ending
+        # after num_chunks results (never if None). body is a memoryview into the received
+        # frame, copy it with bytes(body) to keep it. With a decoder (see resultDecoder.py),
+        # body is what the decoder made of it instead
+        subscriberesultsObj = subscribeResults(measurementID,
+                                               self.token,
+                                               self.ws_obj,
+                                               num_chunks,
+                                               metrics=self.metrics,
+                                               timeout=self.result_timeout)
+        results = subscriberesultsObj.aiter_results()
+        return self.decode_results(results, decoder) if decoder else results
+
+    async def decode_results(self, results, decoder):
+        # Decoded in self.executor, off the event loop; as bytes, so it can be a process pool
+        loop = asyncio.get_event_loop()
+        try:
+            async for counter, body in results:
+                yield counter, await loop.run_in_executor(self.executor, decoder, bytes(body))
+        finally:
+            await results.aclose()
+
+    async def measure(self,
+                      studyID,
+                      input_directory,
+                      out_folder=None,
+                      pacing='realtime',
+                      window=1,
+                      container=False,
+                      accumulator=None,
+                      decoder=None,
+                      follow=False):
+        # A whole measurement of a payload directory: create it, send the chunks and save
+        # the results in out_folder, at the same time. With an accumulator (e.g.
+        # ColumnarResults), every result is also decoded into it by decoder, which must then
+        # be given. With follow, the chunks are sent while the DFX SDK is still writing them
+        # (see follow_chunks())
+        if accumulator is not None and decoder is None:
+            raise ValueError(' An accumulator needs the decoder of the results')
+        manifest = None if follow else PayloadIndex(input_directory)  # Before it is made
+        sink = None
+        if out_folder:
+            sink = ContainerSink(out_folder) if container else FileSink(out_folder)
+        if accumulator is not None:
+            sink = DecodeSink(decoder, accumulator, sink=sink)  # In the default thread pool
+        measurementID = await self.create_measurement(studyID)
+        subscriberesultsObj = subscribeResults(measurementID,
+                                               self.token,
+                                               self.ws_obj,
+                                               manifest.num_chunks if manifest else None,
+                                               sink=sink,
+                                               metrics=self.metrics,
+                                               timeout=self.result_timeout)
+        if follow:
+            chunks = self.until_last(self.follow_chunks(measurementID, input_directory),
+                                     subscriberesultsObj)
+        else:
+            chunks = self.read_chunks(measurementID, input_directory, manifest)
+        await self.supervise(self.add_data(measurementID, chunks, pacing, window),
+                             subscriberesultsObj.subscribe())
+        return measurementID
+
+    @staticmethod
+    async def until_last(chunks, subscriberesultsObj):
+        # Passes the chunks on; once the LAST one comes, the subscription ends after as many
+        # results as there were chunks. Its result can't have arrived yet, it isn't sent yet
+        num_chunks = 0
+        async for chunk in chunks:
+            num_chunks += 1
+            if "LAST" in chunk.Action:
+                subscriberesultsObj.num_chunks = num_chunks
+            yield chunk
+
+
+if __name__ == '__main__':
+    # provide your StudyID and token
+    studyID = ''
+    token = ''
+    rest_url = ''
+    ws_url = ''
+    input_directory = ''
+
+    async def main():
+        async with DfxClient(token, rest_url, ws_url) as client:
+            measurementID = await client.create_measurement(studyID)
+            adding = client.spawn(
+                client.add_data(measurementID, client.read_chunks(measurementID,
+                                                                  input_directory)))
+            async for counter, body in client.results(measurementID, num_chunks=2):
+                print(counter, bytes(body))
+            await adding
+
+    asyncio.run(main())
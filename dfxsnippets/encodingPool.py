@@ -0,0 +1,151 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from dfxsnippets.addData import encode_chunk
+
+_attached = {}  # In each worker process, block name -> SharedMemory, mapped only once
+
+
+def shm_free():
+    # Bytes free in /dev/shm, where shared memory blocks live on Linux; None where it can't be
+    # told. A block is only backed by memory once it is written, so a full /dev/shm doesn't
+    # stop a block being made, but kills the worker writing it with SIGBUS
+    try:
+        st = os.statvfs('/dev/shm')
+    except (AttributeError, OSError):
+        return None
+    return st.f_bavail * st.f_frsize
+
+
+def encode_shared(block_name, block_size, conn_method, measurementID, files, i, num_chunks,
+                  cache, compression, compression_level):
+    # encode_chunk() in a worker process, with the body written to a shared memory block
+    # instead of being pickled back through a pipe; Body becomes its size. Bodies larger than
+    # the block, or without a block (block_name None), are returned as they are
+    chunk = encode_chunk(conn_method, measurementID, files, i, num_chunks, cache, compression,
+                         compression_level)
+    size = len(chunk.Body)
+    if block_name is None or size > block_size:
+        return chunk
+    block = _attached.get(block_name)
+    if block is None:
+        block = _attached[block_name] = shared_memory.SharedMemory(block_name)
+    block.buf[:size] = chunk.Body
+    return chunk._replace(Body=size)
+
+
+class EncodingPool():
+    # Chunks encoded by a pool of processes, several at a time, and handed back in order
+    # through shared memory, so encoding scales with the CPUs and the event loop only copies
+    # the finished bytes. Use it like the executor it wraps:
+    #
+    #   with EncodingPool(workers=4) as encoder:
+    #       async for chunk in encoder.encode_chunks('Websocket', measurementID, chunk_files):
+    #           ...
+    def __init__(self, workers=None, prefetch=None, block_size=4 * 2**20, max_blocks=None):
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.prefetch = prefetch if prefetch else self.workers  # Chunks ahead per measurement
+        self.block_size = block_size  # Largest body passed through shared memory
+        # Most shared memory blocks, however many chunks are in flight; the chunks beyond them
+        # are pickled back
+        self.max_blocks = max_blocks if max_blocks else 2 * self.workers
+        self.blocks = []  # Every shared memory block, one per chunk that was ever in flight
+        self.free = deque()  # Blocks not holding a chunk
+        self.stats = dict(shared=0, pickled=0)  # Chunks encoded with and without a block
+        # The workers share this process's resource tracker, so that the blocks they map
+        # aren't reported as leaked (or unlinked) when a worker exits
+        resource_tracker.ensure_running()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        self.free.clear()
+
+    def acquire(self):
+        # A free block, a new one while there are fewer than max_blocks and /dev/shm has room
+        # for it, and None otherwise
+        if self.free:
+            return self.free.pop()
+        if len(self.blocks) >= self.max_blocks:
+            return None
+        free = shm_free()
+        if free is not None and free < 2 * self.block_size:  # Leave some for everybody else
+            return None
+        block = shared_memory.SharedMemory(create=True, size=self.block_size)
+        self.blocks.append(block)
+        return block
+
+    def receive(self, conn_method, block, chunk):
+        # The chunk with its body copied out of block, which is free again afterwards.
+        # Websocket frames are a bytearray, to fill in the request ID, REST bodies are bytes
+        if block is None:
+            self.stats['pickled'] += 1
+            return chunk
+        try:
+            if isinstance(chunk.Body, int):
+                with block.buf[:chunk.Body] as view:
+                    body = bytes(view) if conn_method == 'REST' else bytearray(view)
+                chunk = chunk._replace(Body=body)
+                self.stats['shared'] += 1
+            else:
+                self.stats['pickled'] += 1
+        finally:
+            self.free.append(block)
+        return chunk
+
+    async def encode_chunks(self,
+                            conn_method,
+                            measurementID,
+                            chunk_files,
+                            cache=None,
+                            compression=None,
+                            compression_level=None,
+                            metrics=None):
+        # Yields the EncodedChunk of every entry of chunk_files, in order, encoding up to
+        # self.prefetch of them at the same time
+        num_chunks = len(chunk_files)
+        pending = deque()  # (concurrent.futures.Future, block) of the chunks being encoded
+        submitted = received = 0
+        try:
+            while received < num_chunks:
+                while submitted < num_chunks and len(pending) < self.prefetch:
+                    if metrics:
+                        metrics.event('prepare', measurementID, submitted)
+                    block = self.acquire()
+                    future = self.executor.submit(encode_shared, block.name if block else None,
+                                                  self.block_size, conn_method, measurementID,
+                                                  chunk_files[submitted], submitted, num_chunks,
+                                                  cache, compression, compression_level)
+                    pending.append((future, block))
+                    submitted += 1
+                # Cancelling this doesn't stop a chunk being encoded, see the finally
+                future, block = pending[0]
+                chunk = await asyncio.wrap_future(future)
+                pending.popleft()
+                chunk = self.receive(conn_method, block, chunk)
+                if metrics:
+                    metrics.event('encoded', measurementID, received)
+                received += 1
+                yield chunk
+        finally:
+            # Stopped early: each block is free again once its chunk is no longer encoded
+            for future, block in pending:
+                if block is None:
+                    future.cancel()
+                elif future.cancel():
+                    self.free.append(block)
+                else:
+                    future.add_done_callback(lambda _, block=block: self.free.append(block))
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import deque
+
+from dfxsnippets.createMeasurement import createMeasurement
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.restHelper import RestHandler
+from dfxsnippets.websocketHelper import WebsocketHandler
+
+
+class MeasurementPool():
+    # Measurement IDs created ahead of time, per study, and open websocket connections, so a
+    # session can start without waiting for a REST round trip or a websocket handshake.
+    # A background task keeps `size` unused measurement IDs of every study, and replaces the
+    # ones older than `ttl` seconds, which the server may no longer accept.
+    def __init__(self,
+                 token,
+                 rest_url,
+                 ws_url,
+                 studyIDs=(),
+                 size=4,
+                 ttl=300.0,
+                 num_connections=1,
+                 restobj=None,
+                 config=None,
+                 metrics=None,
+                 retry_delay=1.0,
+                 retry_policy=None):
+        self.token = token
+        self.rest_url = rest_url
+        self.ws_url = ws_url
+        self.size = size  # Measurement IDs kept ready per study
+        self.ttl = ttl  # Seconds a measurement ID is handed out for after it was created
+        self.retry_delay = retry_delay  # Seconds before refilling again after a failure
+        self.retry_policy = retry_policy  # RetryPolicy for the creates, see createMeasurement
+        self.config = config
+        self.metrics = metrics if metrics else Metrics()
+        self.own_rest = not restobj
+        self.rest_obj = restobj if restobj else RestHandler(token, rest_url)
+        self.ws_objs = [self.new_connection() for _ in range(num_connections)]
+        self.load = [0] * num_connections  # Sessions per connection
+        # studyID -> deque of (measurementID, created time), oldest first. Studies checked out
+        # later are added, and kept warm from then on
+        self.ready = {studyID: deque() for studyID in studyIDs}
+        self.refiller = None  # Background task creating measurements
+        self.wake = None  # asyncio.Event, set to make the refiller check the pool now
+        self.stats = dict(hits=0, misses=0, created=0, expired=0, failed=0, reconnected=0)
+
+    def new_connection(self):
+        return WebsocketHandler(self.token, self.ws_url, config=self.config, metrics=self.metrics)
+
+    async def start(self):
+        await asyncio.gather(*(ws_obj.connect_ws() for ws_obj in self.ws_objs))
+        self.wake = asyncio.Event()
+        self.refiller = asyncio.ensure_future(self.handle_refill())
+
+    async def close(self):
+        if self.refiller:
+            self.refiller.cancel()
+            try:
+                await self.refiller
+            except asyncio.CancelledError:
+                pass
+            self.refiller = None
+        await asyncio.gather(*(ws_obj.handle_close() for ws_obj in self.ws_objs if ws_obj.ws))
+        if self.own_rest:
+            self.rest_obj.close()
+
+    async def create(self, studyID):
+        createmeasurementObj = createMeasurement(studyID,
+                                                 self.token,
+                                                 self.rest_url,
+                                                 restobj=self.rest_obj,
+                                                 metrics=self.metrics,
+                                                 retry_policy=self.retry_policy)
+        return await createmeasurementObj.createAsync()
+
+    def expire(self, studyID):
+        ready = self.ready[studyID]
+        now = time.monotonic()
+        while ready and now - ready[0][1] > self.ttl:
+            measurementID, _ = ready.popleft()
+            self.metrics.discard(measurementID, 'created')  # Never used, so never done
+            self.stats['expired'] += 1
+
+    async def checkout_measurement(self, studyID):
+        # A ready measurement ID of studyID, or a new one if there is none
+        ready = self.ready.setdefault(studyID, deque())
+        self.expire(studyID)
+        if self.wake:
+            self.wake.set()  # Refill in the background
+        if ready:
+            self.stats['hits'] += 1
+            return ready.popleft()[0]  # The oldest, so the fewest expire unused
+        self.stats['misses'] += 1
+        return await self.create(studyID)
+
+    async def checkout_connection(self):
+        # The least loaded connection, connected again first if it was closed for good
+        i = min(range(len(self.ws_objs)), key=lambda i: self.load[i])
+        if self.ws_objs[i].closed:
+            self.ws_objs[i] = self.new_connection()
+            self.load[i] = 0  # Sessions on the old connection are gone with it
+            self.stats['reconnected'] += 1
+            await self.ws_objs[i].connect_ws()
+        self.load[i] += 1
+        return self.ws_objs[i]
+
+    def checkin_connection(self, ws_obj):
+        for i, pooled in enumerate(self.ws_objs):
+            if pooled is ws_obj:
+                self.load[i] -= 1
+
+    async def checkout(self, studyID):
+        # (measurementID, WebsocketHandler) for a new session; checkin_connection() the
+        # WebsocketHandler once the session is over
+        return await self.checkout_measurement(studyID), await self.checkout_connection()
+
+    async def handle_refill(self):
+        while True:
+            self.wake.clear()
+            jobs = []
+            for studyID, ready in self.ready.items():
+                self.expire(studyID)
+                jobs.extend([studyID] * (self.size - len(ready)))
+            failed = False
+            if jobs:
+                created = time.monotonic()  # Counted from before the request, to be safe
+                measurementIDs = await asyncio.gather(*(self.create(studyID) for studyID in jobs),
+                                                      return_exceptions=True)
+                for studyID, measurementID in zip(jobs, measurementIDs):
+                    if isinstance(measurementID, Exception):
+                        self.metrics.log(" Creating a pooled measurement failed:", measurementID)
+                        self.stats['failed'] += 1
+                        failed = True
+                        continue
+                    self.ready[studyID].append((measurementID, created))
+                    self.stats['created'] += 1
+            if failed:
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            # Until something is checked out, or the oldest measurement ID expires
+            oldest = [ready[0][1] for ready in self.ready.values() if ready]
+            timeout = min(oldest) + self.ttl - time.monotonic() if oldest else None
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
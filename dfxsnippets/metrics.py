@@ -0,0 +1,169 @@
+import json
+import time
+
+# Pairs of events whose time difference, for the same measurement and chunk, is a duration
+SPANS = {
+    'encoded': ('prepare', 'encode'),  # Reading and encoding a chunk
+    'ack': ('send', 'ack'),  # Sending a chunk until it is acknowledged
+    'done': ('created', 'measurement'),  # A whole measurement
+}
+
+# Upper bounds, in seconds, of the Prometheus histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metrics():
+    # Timestamps, sizes and queue depths of every chunk and measurement, handed to exporters.
+    # With quiet set, log() prints nothing, which takes the prints out of the hot path.
+    def __init__(self, *exporters, quiet=False):
+        self.exporters = exporters
+        self.quiet = quiet
+        self.started = {}  # (start event, measurementID, chunk) -> time, for SPANS
+
+    def log(self, *args):
+        if not self.quiet:
+            print(*args)
+
+    def event(self, name, measurementID=None, chunk=None, size=None):
+        # Something happened to a chunk (or a measurement, if chunk is None); size is bytes
+        # sent or received
+        if not self.exporters:
+            return
+        now = time.time()
+        event = dict(Time=now, Event=name, MeasurementID=measurementID, Chunk=chunk)
+        if size is not None:
+            event['Bytes'] = size
+        for exporter in self.exporters:
+            exporter.export(event)
+
+        if name in SPANS:
+            start, span = SPANS[name]
+            started = self.started.pop((start, measurementID, chunk), None)
+            if started is not None:
+                for exporter in self.exporters:
+                    exporter.observe(span, now - started)
+        elif any(start == name for start, _ in SPANS.values()):
+            self.started[(name, measurementID, chunk)] = now
+
+    def discard(self, measurementID, start=None):
+        # Forget the spans of a measurement that will never end (only those started by the
+        # start event if given), e.g. the send of a chunk that was refused or timed out, or
+        # the whole measurement once it failed, so a long running process doesn't keep them
+        for key in [key for key in self.started if key[1] == measurementID]:
+            if start is None or key[0] == start:
+                del self.started[key]
+
+    def gauge(self, name, value):
+        # The current value of something, e.g. a queue depth
+        for exporter in self.exporters:
+            exporter.gauge(name, value)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+
+class InMemoryExporter():
+    def __init__(self):
+        self.events = []
+        self.durations = {}  # span -> list of seconds
+        self.gauges = {}  # name -> (last value, max value)
+
+    def export(self, event):
+        self.events.append(event)
+
+    def observe(self, span, seconds):
+        self.durations.setdefault(span, []).append(seconds)
+
+    def gauge(self, name, value):
+        _, highest = self.gauges.get(name, (value, value))
+        self.gauges[name] = (value, max(highest, value))
+
+    def summary(self):
+        # Count, mean, p50 and p99 in seconds of every span
+        summary = {}
+        for span, values in self.durations.items():
+            values = sorted(values)
+            summary[span] = dict(count=len(values),
+                                 mean=sum(values) / len(values),
+                                 p50=values[int(0.50 * (len(values) - 1))],
+                                 p99=values[int(0.99 * (len(values) - 1))])
+        return summary
+
+    def close(self):
+        pass
+
+
+class JsonLinesExporter():
+    # One JSON line per event, duration and gauge
+    def __init__(self, path):
+        self.path = path
+        self.output = open(path, 'a')
+
+    def export(self, event):
+        self.output.write(json.dumps(event) + '\n')
+
+    def observe(self, span, seconds):
+        self.output.write(json.dumps(dict(Time=time.time(), Span=span, Seconds=seconds)) + '\n')
+
+    def gauge(self, name, value):
+        self.output.write(json.dumps(dict(Time=time.time(), Gauge=name, Value=value)) + '\n')
+
+    def close(self):
+        self.output.close()
+
+
+class PrometheusExporter():
+    # Counters, gauges and histograms in the Prometheus text format; render() returns them,
+    # and close() writes them to path (e.g. for the node exporter textfile collector)
+    def __init__(self, path=None, prefix='dfx'):
+        self.path = path
+        self.prefix = prefix
+        self.counts = {}  # event -> number of events
+        self.bytes = {}  # event -> bytes
+        self.gauges = {}  # name -> value
+        self.histograms = {}  # span -> [bucket counts..., count, sum]
+
+    def export(self, event):
+        name = event['Event']
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if 'Bytes' in event:
+            self.bytes[name] = self.bytes.get(name, 0) + event['Bytes']
+
+    def observe(self, span, seconds):
+        histogram = self.histograms.setdefault(span, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def render(self):
+        p = self.prefix
+        lines = ['# TYPE {}_events_total counter'.format(p)]
+        for name, count in sorted(self.counts.items()):
+            lines.append('{}_events_total{{event="{}"}} {}'.format(p, name, count))
+        lines.append('# TYPE {}_bytes_total counter'.format(p))
+        for name, size in sorted(self.bytes.items()):
+            lines.append('{}_bytes_total{{event="{}"}} {}'.format(p, name, size))
+        lines.append('# TYPE {}_gauge gauge'.format(p))
+        for name, value in sorted(self.gauges.items()):
+            lines.append('{}_gauge{{name="{}"}} {}'.format(p, name, value))
+        lines.append('# TYPE {}_duration_seconds histogram'.format(p))
+        for span, histogram in sorted(self.histograms.items()):
+            for bound, count in zip(BUCKETS, histogram):
+                lines.append('{}_duration_seconds_bucket{{span="{}",le="{}"}} {}'.format(
+                    p, span, bound, count))
+            lines.append('{}_duration_seconds_bucket{{span="{}",le="+Inf"}} {}'.format(
+                p, span, histogram[-2]))
+            lines.append('{}_duration_seconds_count{{span="{}"}} {}'.format(p, span, histogram[-2]))
+            lines.append('{}_duration_seconds_sum{{span="{}"}} {}'.format(p, span, histogram[-1]))
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.path:
+            with open(self.path, 'w') as output:
+                output.write(self.render())
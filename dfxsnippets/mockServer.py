@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import websockets
+
+from dfxsnippets.adddata_pb2 import DataRequest, DataResponse
+from dfxsnippets.chunkEncoder import decompress_body
+from dfxsnippets.measurement_pb2 import SubscribeResultsRequest
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    415: 'Unsupported Media Type',
+    429: 'Too Many Requests'
+}
+
+
+class MockDfxServer():
+    def __init__(self, host='localhost', rest_port=9443, ws_port=9080, result_delay=0.5,
+                 result_size=32, rest_delay=0.0, max_rate=None):
+        self.host = host
+        self.rest_port = rest_port
+        self.ws_port = ws_port
+        self.result_delay = result_delay  # Seconds between a chunk arriving and its result
+        self.result_size = result_size  # Number of values per signal in each result
+        self.rest_delay = rest_delay  # Seconds every REST request takes, like a real round trip
+        self.max_rate = max_rate  # Creates and chunks accepted per second, None for no limit
+        self.tokens = max_rate  # Requests that may still be accepted in this second
+        self.updated = time.monotonic()
+        self.rest_server = None
+        self.ws_server = None
+
+        self.measurements = {}  # measurementID -> studyID
+        self.subscribers = {}  # measurementID -> list of (websocket, requestID)
+        self.undelivered = {}  # measurementID -> results sent before anyone subscribed
+        self.connections = set()  # Open websocket connections
+        self.http_tasks = set()  # Tasks serving an open REST connection
+        self.received = set()  # (measurementID, ChunkOrder) of every chunk added
+        self.stats = dict(measurements=0, chunks=0, bytes=0, results=0, throttled=0,
+                          duplicates=0)
+
+    @property
+    def rest_url(self):
+        return "http://{}:{}".format(self.host, self.rest_port)
+
+    @property
+    def ws_url(self):
+        return "ws://{}:{}".format(self.host, self.ws_port)
+
+    async def start(self):
+        self.rest_server = await asyncio.start_server(self.handle_http, self.host, self.rest_port)
+        self.ws_server = await websockets.serve(self.handle_ws, self.host, self.ws_port)
+
+    async def stop(self):
+        self.rest_server.close()
+        # Keep-alive connections the clients haven't closed yet
+        for task in self.http_tasks:
+            task.cancel()
+        await asyncio.gather(*self.http_tasks, return_exceptions=True)
+        await self.rest_server.wait_closed()
+        self.ws_server.close()
+        await self.ws_server.wait_closed()
+
+    async def drop_connections(self):
+        # Close every open websocket connection, like a flaky network would
+        await asyncio.gather(*(ws.close() for ws in list(self.connections)))
+
+    def throttled(self):
+        # Whether to answer 429 to a create or a chunk: a token bucket of max_rate per second
+        if self.max_rate is None:
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.max_rate, self.tokens + (now - self.updated) * self.max_rate)
+        self.updated = now
+        if self.tokens < 1:
+            self.stats['throttled'] += 1
+            return True
+        self.tokens -= 1
+        return False
+
+    def create_measurement(self, studyID):
+        measurementID = uuid.uuid4().hex
+        self.measurements[measurementID] = studyID
+        self.stats['measurements'] += 1
+        return measurementID
+
+    def add_data(self, measurementID, chunkOrder, size):
+        # A chunk sent again is acknowledged again, but only added (and has a result) once
+        if (measurementID, chunkOrder) in self.received:
+            self.stats['duplicates'] += 1
+            return
+        self.received.add((measurementID, chunkOrder))
+        self.stats['chunks'] += 1
+        self.stats['bytes'] += size
+        loop = asyncio.get_event_loop()
+        loop.call_later(self.result_delay, self.emit_result, measurementID, chunkOrder)
+
+    def emit_result(self, measurementID, chunkOrder):
+        result = {}
+        result["ID"] = measurementID
+        result["ChunkOrder"] = chunkOrder
+        result["Results"] = dict(HR_BPM=[70.0 + chunkOrder] * self.result_size,
+                                 SNR=[1.0] * self.result_size)
+        body = json.dumps(result).encode()
+
+        subscribers = self.subscribers.get(measurementID)
+        if not subscribers:
+            self.undelivered.setdefault(measurementID, []).append(body)
+            return
+        for ws, requestID in subscribers:
+            self.send_result(ws, requestID, body)
+
+    def send_result(self, ws, requestID, body):
+        self.stats['results'] += 1
+        asyncio.ensure_future(ws.send(requestID + b'200' + body))
+
+    # REST: POST /measurements and POST /measurements/{ID}/data, over HTTP/1.1 keep-alive
+    async def handle_http(self, reader, writer):
+        self.http_tasks.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if self.rest_delay:
+                    await asyncio.sleep(self.rest_delay)
+                status, response = self.handle_rest(method, path, body,
+                                                    headers.get('content-encoding'))
+                data = json.dumps(response).encode()
+                writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n'
+                             'Content-Length: {}\r\n\r\n'.format(status, HTTP_REASONS[status],
+                                                                 len(data)).encode() + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Cancelled by stop()
+        finally:
+            self.http_tasks.discard(asyncio.current_task())
+            writer.close()
+
+    def handle_rest(self, method, path, body, encoding=None):
+        parts = path.strip('/').split('/')
+        if method != 'POST' or parts[0] != 'measurements':
+            return 404, dict(Code="NOT_FOUND")
+        size = len(body)  # As sent on the wire
+        if encoding and encoding != 'identity':
+            try:
+                body = decompress_body(body, encoding)
+            except (ImportError, ValueError):  # zstandard not installed, or unknown encoding
+                return 415, dict(Code="UNSUPPORTED_ENCODING")
+            except Exception:  # Not valid data for the encoding
+                return 400, dict(Code="INVALID_REQUEST")
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return 400, dict(Code="INVALID_REQUEST")
+
+        if self.throttled():
+            return 429, dict(Code="TOO_MANY_REQUESTS")
+        if len(parts) == 1:
+            return 200, dict(ID=self.create_measurement(data.get("StudyID")))
+        if len(parts) == 3 and parts[2] == 'data' and parts[1] in self.measurements:
+            self.add_data(parts[1], data.get("ChunkOrder", 0), size)
+            return 200, dict(ID=parts[1], ChunkOrder=data.get("ChunkOrder", 0))
+        return 404, dict(Code="NOT_FOUND")
+
+    # Websocket: Buffer( [ string:4 route ][ string:10 requestID ][ protobuf ] )
+    async def handle_ws(self, ws, path=None):
+        self.connections.add(ws)
+        try:
+            async for message in ws:
+                route = message[0:4].decode('utf-8')
+                requestID = message[4:14]
+                if route == '0506':
+                    request = DataRequest()
+                    request.ParseFromString(message[14:])
+                    measurementID = request.Params.ID
+                    if measurementID not in self.measurements:
+                        await ws.send(requestID + b'404')
+                        continue
+                    if self.throttled():
+                        await ws.send(requestID + b'429')
+                        continue
+                    self.add_data(measurementID, request.ChunkOrder, len(message))
+                    response = DataResponse(ID=measurementID, ChunkOrder=request.ChunkOrder)
+                    await ws.send(requestID + b'200' + response.SerializeToString())
+                elif route == '0510':
+                    request = SubscribeResultsRequest()
+                    request.ParseFromString(message[14:])
+                    measurementID = request.Params.ID
+                    self.subscribers.setdefault(measurementID, []).append((ws, requestID))
+                    await ws.send(requestID + b'200')
+                    for body in self.undelivered.pop(measurementID, []):
+                        self.send_result(ws, requestID, body)
+                else:
+                    await ws.send(requestID + b'404')
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+            for measurementID in list(self.subscribers):
+                self.subscribers[measurementID] = [
+                    s for s in self.subscribers[measurementID] if s[0] is not ws
+                ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline stand-in for the DFX API")
+    parser.add_argument("--host", help="Host to listen on", default="localhost")
+    parser.add_argument("--restPort", help="REST port", type=int, default=9443)
+    parser.add_argument("--wsPort", help="Websocket port", type=int, default=9080)
+    parser.add_argument("--resultDelay", help="Seconds until a result is sent", type=float,
+                        default=0.5)
+    parser.add_argument("--restDelay", help="Seconds every REST request takes", type=float,
+                        default=0.0)
+    parser.add_argument("--maxRate",
+                        help="Creates and chunks accepted per second, the rest get a 429",
+                        type=float,
+                        default=None)
+    args = parser.parse_args()
+
+    server = MockDfxServer(args.host,
+                           args.restPort,
+                           args.wsPort,
+                           result_delay=args.resultDelay,
+                           rest_delay=args.restDelay,
+                           max_rate=args.maxRate)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start())
+    print(" Mock DFX API on", server.rest_url, "and", server.ws_url)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    loop.run_until_complete(server.stop())
+    loop.close()
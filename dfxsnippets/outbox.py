@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from dfxsnippets.addData import addData, encode_chunk
+from dfxsnippets.chunkEncoder import EncodedChunk, encode_ws_header
+from dfxsnippets.createMeasurement import createMeasurement
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.payloadIndex import PayloadIndex
+from dfxsnippets.payloadTail import PayloadTail
+from dfxsnippets.restHelper import RestHandler
+from dfxsnippets.retryPolicy import RetryPolicy
+from dfxsnippets.websocketHelper import WebsocketHandler
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    key TEXT PRIMARY KEY,
+    studyID TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    measurementID TEXT,
+    lastOrder INTEGER,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    key TEXT NOT NULL,
+    chunkOrder INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    startTime INTEGER,
+    endTime INTEGER,
+    duration REAL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (key, chunkOrder)
+);
+'''
+
+
+class Outbox():
+    # Encoded chunks waiting to be uploaded, in a SQLite database, so that capturing never
+    # waits for the network, and nothing is lost or encoded again if the process restarts.
+    # Chunks are added under a key that names the measurement on this machine, before the
+    # measurement exists on the server; an OutboxDrainer creates it, uploads the chunks and
+    # deletes each one once it is acknowledged.
+    def __init__(self, path, conn_method='Websocket', compression=None, compression_level=None):
+        self.path = path
+        self.conn_method = conn_method  # How the chunks are encoded, for REST or websockets
+        self.compression = compression if conn_method == 'REST' else None
+        self.compression_level = compression_level if self.compression else None
+        # Websocket frames are stored without this header, which holds the measurementID
+        self.header = b'' if conn_method == 'REST' else encode_ws_header('0506', '')
+        # One connection shared by every thread, e.g. capturing in one and draining in another;
+        # other processes can open the same file. Without isolation_level, every statement
+        # outside a transaction() commits on its own
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30.0, isolation_level=None,
+                                  check_same_thread=False)
+        self.db.execute('PRAGMA auto_vacuum=INCREMENTAL')  # Only takes effect on a new file
+        self.db.execute('PRAGMA journal_mode=WAL')  # Readers and the writer don't block
+        self.db.execute('PRAGMA synchronous=NORMAL')  # Survives crashes, fsyncs less
+        self.db.executescript(SCHEMA)
+        self.check_settings()
+
+    def check_settings(self):
+        # The stored chunks were encoded one way, the outbox can't be reopened another way
+        settings = dict(conn_method=self.conn_method,
+                        compression=self.compression,
+                        compression_level=self.compression_level)
+        with self.transaction():
+            for name, value in settings.items():
+                self.db.execute('INSERT OR IGNORE INTO settings VALUES (?, ?)',
+                                (name, None if value is None else str(value)))
+            stored = dict(self.db.execute('SELECT name, value FROM settings'))
+        for name, value in settings.items():
+            if stored[name] != (None if value is None else str(value)):
+                raise ValueError(' Outbox {} holds chunks encoded with {}={}, not {}'.format(
+                    self.path, name, stored[name], value))
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def add_measurement(self, key, studyID, resolution=0):
+        # Does nothing if key was already added
+        with self.lock:
+            self.db.execute('INSERT OR IGNORE INTO measurements (key, studyID, resolution) '
+                            'VALUES (?, ?, ?)', (key, studyID, resolution))
+
+    def encode(self, files, i, num_chunks):
+        # Chunk i of a payload directory (see encode_chunk()), as put() stores it
+        chunk = encode_chunk(self.conn_method, '', files, i, num_chunks, None, self.compression,
+                             self.compression_level)
+        if self.header:
+            chunk = chunk._replace(Body=bytes(memoryview(chunk.Body)[len(self.header):]))
+        return chunk
+
+    def put(self, key, chunk):
+        # Store an EncodedChunk made by encode() for the measurement key; a chunk of the same
+        # ChunkOrder that is already stored is left as it is
+        with self.transaction():
+            if not self.db.execute('SELECT 1 FROM measurements WHERE key = ?', (key, )).fetchone():
+                raise ValueError(' No measurement {} in the outbox'.format(key))
+            self.db.execute('INSERT OR IGNORE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (key, ) + tuple(chunk))
+            if "LAST" in chunk.Action:
+                self.db.execute('UPDATE measurements SET lastOrder = ? WHERE key = ?',
+                                (chunk.ChunkOrder, key))
+
+    def add_directory(self, key, studyID, input_directory, resolution=0):
+        # Encode and store every chunk of a payload directory
+        manifest = PayloadIndex(input_directory)
+        self.add_measurement(key, studyID, resolution)
+        num_chunks = len(manifest.chunk_files)
+        for i, files in enumerate(manifest.chunk_files):
+            self.put(key, self.encode(files, i, num_chunks))
+        return num_chunks
+
+    async def follow_directory(self, key, studyID, input_directory, resolution=0,
+                               **tail_options):
+        # Same as add_directory() for a payload directory the DFX SDK is still writing: every
+        # chunk is stored as soon as its files are complete, and the last one as the LAST once
+        # the capture wrote its end marker (tail_options are handed to the PayloadTail). The
+        # drainer uploads the chunks stored so far meanwhile
+        self.add_measurement(key, studyID, resolution)
+        loop = asyncio.get_event_loop()
+        num_chunks = 0
+        async for i, files, last in PayloadTail(input_directory, **tail_options).aiter_files():
+            # encode() takes the action from the number of chunks: i + 1 makes chunk i the
+            # LAST, any more a FIRST or CHUNK
+            chunk = await loop.run_in_executor(None, self.encode, files, i,
+                                               i + 1 if last else i + 2)
+            await loop.run_in_executor(None, self.put, key, chunk)
+            num_chunks += 1
+        return num_chunks
+
+    def pending(self):
+        # Keys of the measurements with chunks to upload, oldest first
+        with self.lock:
+            return [
+                row[0] for row in self.db.execute(
+                    'SELECT key FROM measurements WHERE NOT failed AND EXISTS '
+                    '(SELECT 1 FROM chunks WHERE chunks.key = measurements.key) ORDER BY rowid')
+            ]
+
+    def measurement(self, key):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT studyID, resolution, measurementID, lastOrder, failed '
+                'FROM measurements WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('studyID', 'resolution', 'measurementID', 'lastOrder', 'failed'), row))
+
+    def set_measurement_id(self, key, measurementID):
+        with self.lock:
+            self.db.execute('UPDATE measurements SET measurementID = ? WHERE key = ?',
+                            (measurementID, key))
+
+    def chunks(self, key, prefix=b''):
+        # Yields the stored chunks of key in ChunkOrder order, each read only when it is due,
+        # with prefix (e.g. the websocket header of the measurement) in front of the body
+        with self.lock:
+            orders = [
+                row[0] for row in self.db.execute(
+                    'SELECT chunkOrder FROM chunks WHERE key = ? ORDER BY chunkOrder', (key, ))
+            ]
+        for chunkOrder in orders:
+            with self.lock:
+                row = self.db.execute(
+                    'SELECT chunkOrder, action, startTime, endTime, duration, body FROM chunks '
+                    'WHERE key = ? AND chunkOrder = ?', (key, chunkOrder)).fetchone()
+            if row is None:  # Acknowledged meanwhile
+                continue
+            if self.header:  # A bytearray, so the request ID can be filled in
+                body = bytearray(len(prefix) + len(row[-1]))
+                body[:len(prefix)] = prefix
+                body[len(prefix):] = row[-1]
+            else:
+                body = row[-1]
+            yield EncodedChunk(*row[:-1], body)
+
+    def ack(self, key, chunkOrder):
+        # The chunk is on the server, it is never sent again
+        with self.lock:
+            self.db.execute('DELETE FROM chunks WHERE key = ? AND chunkOrder = ?',
+                            (key, chunkOrder))
+
+    def fail(self, key):
+        # The server refused a chunk; the measurement is left out of pending() from now on
+        with self.lock:
+            self.db.execute('UPDATE measurements SET failed = 1 WHERE key = ?', (key, ))
+
+    def complete(self, key):
+        # Forget the measurement if its LAST chunk was stored and every chunk acknowledged
+        with self.transaction():
+            row = self.db.execute(
+                'SELECT lastOrder IS NOT NULL AND NOT EXISTS '
+                '(SELECT 1 FROM chunks WHERE chunks.key = measurements.key) '
+                'FROM measurements WHERE key = ?', (key, )).fetchone()
+            if not row or not row[0]:
+                return False
+            self.db.execute('DELETE FROM measurements WHERE key = ?', (key, ))
+        return True
+
+    def compact(self):
+        # Give the space of the deleted chunks back to the file system
+        with self.lock:
+            # executescript() runs it to the end, execute() would free a single page
+            self.db.executescript('PRAGMA incremental_vacuum;')
+            self.db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def size(self):
+        # (number of chunks, bytes of their bodies) waiting to be uploaded
+        with self.lock:
+            count, size = self.db.execute(
+                'SELECT COUNT(*), SUM(LENGTH(body)) FROM chunks').fetchone()
+        return count, size or 0
+
+
+class OutboxDrainer():
+    # Uploads what is in an Outbox whenever the network allows: creates each measurement,
+    # sends its chunks with addData and deletes every chunk once it is acknowledged. If the
+    # upload fails, or a chunk is throttled or gets a server error even after the retry_policy's
+    # attempts, it tries again after retry_delay seconds, for as long as it runs. Only a
+    # measurement with a chunk the server refused for good (any other 4xx) is given up.
+    def __init__(self,
+                 outbox,
+                 token,
+                 rest_url,
+                 ws_url,
+                 restobj=None,
+                 config=None,
+                 metrics=None,
+                 retry_policy=None,
+                 window=4,
+                 poll_interval=1.0,
+                 retry_delay=5.0,
+                 connect_timeout=10.0,
+                 ack_timeout=30.0):
+        self.outbox = outbox
+        self.token = token
+        self.rest_url = rest_url
+        self.ws_url = ws_url
+        self.config = config  # WebsocketConfig
+        self.metrics = metrics if metrics else Metrics()
+        # RetryPolicy for the creates and the chunks, so that throttling is absorbed
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.window = window  # Unacknowledged chunks in flight, see addData.sendAsync()
+        self.poll_interval = poll_interval  # Seconds between looks at an empty outbox
+        self.retry_delay = retry_delay  # Seconds before trying again after a failed upload
+        self.connect_timeout = connect_timeout
+        self.ack_timeout = ack_timeout
+        self.own_rest = not restobj
+        self.rest_obj = restobj if restobj else RestHandler(token, rest_url)
+        self.ws_obj = None  # Connected when there is something to upload
+        self.stats = dict(measurements=0, chunks=0, failed=0, errors=0, deferred=0)
+
+    async def close(self):
+        if self.ws_obj and self.ws_obj.ws:
+            await self.ws_obj.handle_close()
+        if self.own_rest:
+            self.rest_obj.close()
+
+    async def connection(self):
+        # The websocket connection, connected again if it was closed for good
+        if self.ws_obj is None or self.ws_obj.closed:
+            ws_obj = WebsocketHandler(self.token, self.ws_url, config=self.config,
+                                      metrics=self.metrics)
+            await asyncio.wait_for(ws_obj.connect_ws(), self.connect_timeout)
+            self.ws_obj = ws_obj
+        return self.ws_obj
+
+    async def run(self, once=False):
+        # Upload until cancelled, or with once, until the outbox has nothing left to upload
+        errors = (OSError, ValueError, asyncio.TimeoutError)
+        if self.outbox.conn_method == 'Websocket':
+            import websockets  # A failed handshake, e.g. a proxy's 502, is a WebSocketException
+            errors += (websockets.WebSocketException, )
+        while True:
+            keys = self.outbox.pending()
+            if not keys:
+                if once:
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                deferred = [key for key in keys if not await self.drain(key)]
+            except errors as e:
+                # Most likely offline; everything not acknowledged is still in the outbox
+                self.stats['errors'] += 1
+                self.metrics.log(" Upload failed, trying again in", self.retry_delay, "s:", e)
+                await asyncio.sleep(self.retry_delay)
+                continue
+            if deferred:  # Throttled or a server error; their chunks are still in the outbox
+                self.stats['deferred'] += 1
+                self.metrics.log(" Upload of", len(deferred), "measurements deferred, trying "
+                                 "again in", self.retry_delay, "s")
+                await asyncio.sleep(self.retry_delay)
+
+    def refused(self, status_code):
+        # Whether a chunk that got status_code was refused for good, rather than throttled or
+        # hit by a server error (or no response) that may pass
+        return (status_code is not None and status_code.startswith('4')
+                and status_code not in self.retry_policy.retry_statuses)
+
+    async def drain(self, key):
+        # Upload the stored chunks of one measurement, creating it first if needed; returns
+        # False if they are to be sent again later
+        measurement = self.outbox.measurement(key)
+        measurementID = measurement['measurementID']
+        if measurementID is None:
+            createmeasurementObj = createMeasurement(measurement['studyID'],
+                                                     self.token,
+                                                     self.rest_url,
+                                                     resolution=measurement['resolution'],
+                                                     restobj=self.rest_obj,
+                                                     metrics=self.metrics,
+                                                     retry_policy=self.retry_policy)
+            measurementID = await createmeasurementObj.createAsync()
+            self.outbox.set_measurement_id(key, measurementID)
+
+        ws_obj = None
+        prefix = b''
+        if self.outbox.conn_method == 'Websocket':
+            ws_obj = await self.connection()
+            prefix = encode_ws_header('0506', measurementID)
+
+        def on_ack(chunkOrder):
+            self.outbox.ack(key, chunkOrder)
+            self.stats['chunks'] += 1
+
+        async def chunks():
+            for chunk in self.outbox.chunks(key, prefix):
+                yield chunk
+
+        adddataObj = addData(measurementID,
+                             self.token,
+                             self.rest_url,
+                             ws_obj,
+                             None,
+                             restobj=self.rest_obj,
+                             metrics=self.metrics,
+                             ack_timeout=self.ack_timeout,
+                             compression=self.outbox.compression,
+                             compression_level=self.outbox.compression_level,
+                             retry_policy=self.retry_policy,
+                             on_ack=on_ack)
+        if not await adddataObj.sendAsync('window', self.window, chunks=chunks()):
+            if not self.refused(adddataObj.refused):
+                return False
+            self.outbox.fail(key)
+            self.stats['failed'] += 1
+            self.metrics.log(" Measurement", key, "was refused with", adddataObj.refused + ",",
+                             "it won't be uploaded again")
+        elif self.outbox.complete(key):
+            # Its results aren't subscribed to, so no 'done' ends the measurement span
+            self.metrics.discard(measurementID, 'created')
+            self.stats['measurements'] += 1
+            self.metrics.log(" Measurement", key, "uploaded as", measurementID)
+            self.outbox.compact()
+        return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Store payload directories in an outbox, and "
+                                     "upload the outbox whenever the network allows")
+    parser.add_argument("outbox", help="Outbox database file")
+    parser.add_argument("--connectionMethod", choices=["REST", "Websocket"], default="Websocket")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Store the chunks of a payload directory")
+    add.add_argument("key", help="Name of the measurement in the outbox")
+    add.add_argument("studyID", help="StudyID")
+    add.add_argument("payloadDir", help="Directory of payload files")
+    add.add_argument("--follow",
+                     help="Store the chunks while the DFX SDK is still writing payloadDir, "
+                     "until it writes its end marker",
+                     action="store_true")
+    drain = commands.add_parser("drain", help="Upload everything in the outbox")
+    drain.add_argument("token", help="user or device token")
+    drain.add_argument("--restUrl", default="https://qa.api.deepaffex.ai:9443")
+    drain.add_argument("--wsUrl", default="wss://qa.api.deepaffex.ai:9080")
+    drain.add_argument("--once", help="Stop once the outbox is empty", action="store_true")
+    args = parser.parse_args()
+
+    outbox = Outbox(args.outbox, args.connectionMethod, args.compression)
+    if args.command == "add" and args.follow:
+        print("Stored",
+              asyncio.run(outbox.follow_directory(args.key, args.studyID, args.payloadDir)),
+              "chunks")
+    elif args.command == "add":
+        print("Stored", outbox.add_directory(args.key, args.studyID, args.payloadDir), "chunks")
+    else:
+
+        async def run():
+            drainer = OutboxDrainer(outbox, args.token, args.restUrl, args.wsUrl,
+                                    retry_policy=RetryPolicy())
+            try:
+                await drainer.run(once=args.once)
+            finally:
+                await drainer.close()
+            print("Uploaded", drainer.stats)
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    outbox.close()
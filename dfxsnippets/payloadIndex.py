@@ -0,0 +1,152 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+# One chunk of a payload directory: its three files, and what its properties say about it
+ChunkEntry = namedtuple('ChunkEntry', [
+    'Index', 'Payload', 'Metadata', 'Properties', 'PayloadSize', 'ChunkOrder', 'StartTime',
+    'EndTime', 'Duration', 'SDK'
+])
+
+MANIFEST_NAME = '.dfxmanifest.json'
+MANIFEST_VERSION = 1
+
+_CHUNK_FILE = re.compile(r'^(payload|metadata|properties)(\d+)\.(bin|json)$')
+_EXTENSIONS = dict(payload='bin', metadata='bin', properties='json')
+
+
+def chunk_times(meta, properties):
+    # ChunkOrder, StartTime, EndTime and Duration of a chunk; the names of the properties
+    # depend on the version of the DFX SDK that made them
+    try:
+        if meta["dfxsdk"] < "4.0":
+            return (properties['chunkNumber'], properties['startTime_s'],
+                    properties['endTime_s'], properties['duration_s'])
+    except (KeyError, TypeError):
+        pass
+    return (properties['chunk_number'], properties['start_time_s'], properties['end_time_s'],
+            properties['duration_s'])
+
+
+class PayloadIndex():
+    # The chunks of a payload directory, found with a single directory scan and checked before
+    # anything is sent. The manifest is saved in the directory (or manifest_path) and reused
+    # as long as no file changed, so only the scan is repeated.
+    def __init__(self, directory, manifest_path=None, validate=True):
+        self.directory = directory
+        self.manifest_path = manifest_path if manifest_path else os.path.join(
+            directory, MANIFEST_NAME)
+        self.chunks = []  # ChunkEntry of every chunk, in index order
+        self.stamps = {}  # file name -> [size, mtime_ns], to tell whether the manifest is stale
+        self.index()
+        if validate:
+            self.validate()
+
+    @property
+    def num_chunks(self):
+        return len(self.chunks)
+
+    @property
+    def chunk_files(self):
+        # (payload, metadata, properties) paths of every chunk
+        return [(chunk.Payload, chunk.Metadata, chunk.Properties) for chunk in self.chunks]
+
+    def scan(self):
+        # One pass over the directory; returns index -> {kind: DirEntry}
+        found = {}
+        self.stamps = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = _CHUNK_FILE.match(entry.name)
+                if not match:
+                    continue
+                kind, i, extension = match.groups()
+                if _EXTENSIONS[kind] != extension:
+                    continue
+                st = entry.stat()
+                self.stamps[entry.name] = [st.st_size, st.st_mtime_ns]
+                found.setdefault(int(i), {})[kind] = entry
+        return found
+
+    def index(self):
+        found = self.scan()
+        missing = [
+            "{}{}.{}".format(kind, i, _EXTENSIONS[kind]) for i in sorted(found)
+            for kind in _EXTENSIONS if kind not in found[i]
+        ]
+        if missing:
+            raise ValueError('Missing files in {}: {}'.format(self.directory, ', '.join(missing)))
+        if self.load():
+            return
+
+        self.chunks = []
+        for i in sorted(found):
+            files = found[i]
+            with open(files['metadata'].path, 'r') as input_file:
+                meta = json.load(input_file)
+            with open(files['properties'].path, 'r') as input_file:
+                properties = json.load(input_file)
+            chunkOrder, startTime, endTime, duration = chunk_times(meta, properties)
+            self.chunks.append(
+                ChunkEntry(i, files['payload'].path, files['metadata'].path,
+                           files['properties'].path, self.stamps[files['payload'].name][0],
+                           chunkOrder, startTime, endTime, duration, meta.get("dfxsdk")))
+        self.save()
+
+    def load(self):
+        # Use the saved manifest if every file is exactly as it was when it was made
+        try:
+            with open(self.manifest_path, 'r') as input_file:
+                manifest = json.load(input_file)
+        except (OSError, ValueError):
+            return False
+        if manifest.get("Version") != MANIFEST_VERSION or manifest.get("Files") != self.stamps:
+            return False
+        prefix = os.path.join(self.directory, '')
+        self.chunks = [
+            ChunkEntry(chunk[0], prefix + chunk[1], prefix + chunk[2], prefix + chunk[3],
+                       *chunk[4:]) for chunk in manifest["Chunks"]
+        ]
+        return True
+
+    def save(self):
+        manifest = {}
+        manifest["Version"] = MANIFEST_VERSION
+        manifest["Files"] = self.stamps
+        manifest["Chunks"] = [[
+            chunk[0],
+            os.path.basename(chunk[1]),
+            os.path.basename(chunk[2]),
+            os.path.basename(chunk[3]), *chunk[4:]
+        ] for chunk in self.chunks]
+        try:
+            with open(self.manifest_path, 'w') as output_file:
+                json.dump(manifest, output_file)
+        except OSError:  # A read-only payload directory, it will just be indexed again
+            pass
+
+    def validate(self):
+        # Every problem of the directory at once, before any chunk is sent
+        problems = []
+        if not self.chunks:
+            problems.append('no chunks')
+        indices = [chunk.Index for chunk in self.chunks]
+        if indices != list(range(len(indices))):
+            gaps = sorted(set(range(max(indices, default=-1) + 1)) - set(indices))
+            problems.append('chunk files are not numbered 0 to {}, missing {}'.format(
+                len(indices) - 1, gaps))
+        for previous, chunk in zip(self.chunks, self.chunks[1:]):
+            if chunk.ChunkOrder != previous.ChunkOrder + 1:
+                problems.append('chunk {} has ChunkOrder {} after {}'.format(
+                    chunk.Index, chunk.ChunkOrder, previous.ChunkOrder))
+            if chunk.StartTime < previous.StartTime:
+                problems.append('chunk {} starts at {}, before chunk {} at {}'.format(
+                    chunk.Index, chunk.StartTime, previous.Index, previous.StartTime))
+        for chunk in self.chunks:
+            if chunk.EndTime < chunk.StartTime:
+                problems.append('chunk {} ends at {}, before it starts at {}'.format(
+                    chunk.Index, chunk.EndTime, chunk.StartTime))
+        if problems:
+            raise ValueError('Invalid payload directory {}: {}'.format(
+                self.directory, '; '.join(problems)))
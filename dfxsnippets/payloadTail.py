@@ -0,0 +1,202 @@
+import asyncio
+import os
+import struct
+import time
+
+from dfxsnippets.payloadIndex import _CHUNK_FILE, _EXTENSIONS
+
+# The file the capture writes into the payload directory once it has written the last chunk
+END_MARKER_NAME = 'capture.end'
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT = struct.Struct('iIII')  # struct inotify_event: wd, mask, cookie, len, then the name
+
+
+def inotify_watch(directory):
+    # A non-blocking inotify file descriptor watching the files of directory, or None where
+    # inotify isn't available (not Linux, or out of inotify instances)
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        inotify_init1, inotify_add_watch = libc.inotify_init1, libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+    fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        return None
+    mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+    if inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def read_events(fd):
+    # (mask, file name) of every event waiting on an inotify file descriptor
+    events = []
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return events
+        pos = 0
+        while pos < len(data):
+            _, mask, _, size = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            events.append((mask, os.fsdecode(data[pos:pos + size].rstrip(b'\0'))))
+            pos += size
+
+
+class PayloadTail():
+    # The chunks of a payload directory that the DFX SDK is still writing, in order, each as
+    # soon as its three files are complete, until the end marker file appears. A file is
+    # complete once inotify reports it closed after writing or moved in (on Linux), or, without
+    # inotify and for files that were already there, once it hasn't changed for `settle`
+    # seconds; every file is complete once the end marker is there. A chunk is only handed out
+    # once the next one is complete or the end marker is there, so it is known whether it is
+    # the LAST.
+    def __init__(self,
+                 directory,
+                 end_marker=END_MARKER_NAME,
+                 poll_interval=0.5,
+                 settle=1.0,
+                 idle_timeout=None,
+                 use_inotify=True):
+        self.directory = directory
+        self.end_marker = end_marker  # Name of the end of capture marker file
+        self.poll_interval = poll_interval  # Seconds between scans, without inotify events
+        self.settle = settle  # Seconds a file must stay unchanged without inotify
+        self.idle_timeout = idle_timeout  # Seconds without a new chunk to give up, None never
+        self.use_inotify = use_inotify
+        self.fd = None  # inotify file descriptor, None when polling
+        self.changed = None  # asyncio.Event, set by inotify events
+        self.writing = set()  # Files inotify saw written to and not closed yet
+        self.closed = set()  # Files inotify saw closed after writing, or moved in
+        self.stamps = {}  # file name -> ((size, mtime_ns), when it was first seen like that)
+        self.stats = dict(scans=0, chunks=0)
+
+    @property
+    def mode(self):
+        return 'polling' if self.fd is None else 'inotify'
+
+    def start(self):
+        if self.use_inotify:
+            self.fd = inotify_watch(self.directory)
+        if self.fd is not None:
+            self.changed = asyncio.Event()
+            asyncio.get_event_loop().add_reader(self.fd, self.handle_events)
+
+    def close(self):
+        if self.fd is not None:
+            asyncio.get_event_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def handle_events(self):
+        for mask, name in read_events(self.fd):
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.writing.discard(name)
+                self.closed.add(name)
+            elif mask & (IN_CREATE | IN_MODIFY):
+                self.closed.discard(name)
+                self.writing.add(name)
+        self.changed.set()
+
+    def complete(self, entry, now):
+        if entry.name in self.closed:
+            return True
+        if entry.name in self.writing:
+            return False
+        st = entry.stat()
+        stamp = (st.st_size, st.st_mtime_ns)
+        seen = self.stamps.get(entry.name)
+        if seen is None or seen[0] != stamp:
+            self.stamps[entry.name] = (stamp, now)
+            return False
+        return now - seen[1] >= self.settle
+
+    def scan(self):
+        # index -> {kind: path, or None while the file isn't complete}, and whether the end
+        # marker is there
+        found = {}
+        now = time.monotonic()
+        # The end marker is written after the last chunk, so every chunk file is complete then.
+        # It is looked for before the listing, which isn't a snapshot of the directory: a file
+        # written before the marker may be missing from a listing that has the marker, but not
+        # from one made after the marker was seen
+        ended = os.path.exists(os.path.join(self.directory, self.end_marker))
+        with os.scandir(self.directory) as entries:
+            entries = list(entries)
+        for entry in entries:
+            match = _CHUNK_FILE.match(entry.name)
+            if not match:
+                continue
+            kind, i, extension = match.groups()
+            if _EXTENSIONS[kind] != extension:
+                continue
+            path = entry.path if ended or self.complete(entry, now) else None
+            found.setdefault(int(i), {})[kind] = path
+        self.stats['scans'] += 1
+        return found, ended
+
+    async def wait(self):
+        # Until inotify reports a change, or poll_interval seconds, for the files still settling
+        if self.fd is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        try:
+            await asyncio.wait_for(self.changed.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self.changed.clear()
+
+    @staticmethod
+    def missing(found, i):
+        # What is missing of chunk i once the end marker is there
+        if not found:
+            return 'no chunks'
+        if i not in found:
+            return 'chunk {} is missing, chunk files go up to {}'.format(i, max(found))
+        return 'chunk {} has no {} file'.format(
+            i, ' or '.join(kind for kind in sorted(_EXTENSIONS) if kind not in found[i]))
+
+    async def aiter_files(self):
+        # Yields (i, (payload, metadata, properties), last) for chunk 0, 1, ... as they are
+        # complete; last is True for the final chunk, after which it returns
+        self.start()
+        try:
+            i = 0
+            idle_since = time.monotonic()
+            while True:
+                found, ended = self.scan()
+
+                def ready(j):
+                    return len(found.get(j, ())) == 3 and all(found[j].values())
+
+                while ready(i):
+                    last = ended and not any(j > i for j in found)
+                    if not last and not ready(i + 1):
+                        break
+                    files = found[i]
+                    self.stats['chunks'] += 1
+                    idle_since = time.monotonic()
+                    yield i, (files['payload'], files['metadata'], files['properties']), last
+                    if last:
+                        return
+                    i += 1
+
+                if ended:  # Nothing more is coming, but chunk i or i + 1 isn't complete
+                    raise ValueError('Invalid payload directory {}: {}'.format(
+                        self.directory, self.missing(found, i if not ready(i) else i + 1)))
+                if self.idle_timeout and time.monotonic() - idle_since > self.idle_timeout:
+                    raise asyncio.TimeoutError('No new chunk in {} within {} seconds'.format(
+                        self.directory, self.idle_timeout))
+                await self.wait()
+        finally:
+            self.close()
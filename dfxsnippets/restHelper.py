@@ -0,0 +1,41 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RestHandler():
+    def __init__(self, token, rest_url, num_pools=10, pool_size=10):
+        # requests is only imported when a RestHandler is made, so importing this module
+        # (e.g. for websockets only) stays cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.token = token
+        self.rest_url = rest_url
+        self.headers = dict(Authorization="Bearer {}".format(self.token))
+        self.headers['Content-Type'] = "application/json"
+
+        # One keep-alive session shared by every request, so each request reuses an open
+        # TCP+TLS connection instead of doing a new handshake.
+        # num_pools: number of hosts to keep connections for
+        # pool_size: maximum number of open connections per host
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=num_pools, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # No more threads than connections, so no thread ever waits for a free connection
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+
+    def post(self, path, **kwargs):
+        return self.session.post(self.rest_url + path, **kwargs)
+
+    async def post_async(self, path, **kwargs):
+        loop = asyncio.get_event_loop()
+        requestFunction = functools.partial(self.post, path, **kwargs)
+        return await loop.run_in_executor(self.executor, requestFunction)
+
+    def close(self):
+        self.session.close()
+        self.executor.shutdown(wait=False)
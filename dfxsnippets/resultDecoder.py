@@ -0,0 +1,114 @@
+import json
+from array import array
+from collections import namedtuple
+
+from dfxsnippets.resultSink import ResultSink
+
+# One decoded result: the signals of one chunk, name -> list of values
+DecodedResult = namedtuple('DecodedResult', ['MeasurementID', 'ChunkOrder', 'Signals'])
+
+
+def decode_json_result(body):
+    # A decoder for the JSON results of the mock server only, the DFX API sends results in
+    # another format (decoded by the DFX SDK). A plain function so that it can also run in a
+    # process pool
+    data = json.loads(bytes(body))
+    return DecodedResult(data.get("ID"), data.get("ChunkOrder"), data.get("Results", {}))
+
+
+class ColumnarResults():
+    # The values of every signal across a measurement, one array per signal, so analytics get
+    # a column per signal instead of a list of per-chunk dicts. The arrays are stdlib
+    # array('d'), turned into NumPy arrays or an Arrow table on request
+    def __init__(self):
+        self.values = {}  # signal -> array('d') of its values, chunk after chunk
+        self.chunks = {}  # signal -> array('q') of the ChunkOrder of each chunk in values
+        self.offsets = {}  # signal -> array('q') of where each chunk starts in values
+        self.count = 0  # Number of results added
+
+    @property
+    def signals(self):
+        return sorted(self.values)
+
+    def add(self, result):
+        for signal, values in result.Signals.items():
+            if signal not in self.values:
+                self.values[signal] = array('d')
+                self.chunks[signal] = array('q')
+                self.offsets[signal] = array('q')
+            self.chunks[signal].append(result.ChunkOrder)
+            self.offsets[signal].append(len(self.values[signal]))
+            self.values[signal].fromlist(values)
+        self.count += 1
+
+    def chunk_orders(self, signal):
+        # The ChunkOrder of every value of a signal
+        chunk_orders = array('q')
+        ends = self.offsets[signal][1:] + array('q', [len(self.values[signal])])
+        for chunkOrder, start, end in zip(self.chunks[signal], self.offsets[signal], ends):
+            chunk_orders.extend(array('q', [chunkOrder]) * (end - start))
+        return chunk_orders
+
+    def to_numpy(self, signal):
+        # (ChunkOrder, values) of a signal as two NumPy arrays
+        import numpy  # Optional, only needed here
+        return (numpy.array(self.chunk_orders(signal), dtype=numpy.int64),
+                numpy.array(self.values[signal], dtype=numpy.float64))
+
+    def to_arrow(self):
+        # Every value as a row of an Arrow table with Signal (dictionary encoded), ChunkOrder
+        # and Value columns
+        import pyarrow  # Optional, only needed here
+        indices, chunk_orders, values = array('i'), array('q'), array('d')
+        for i, signal in enumerate(self.signals):
+            indices.extend(array('i', [i]) * len(self.values[signal]))
+            chunk_orders.extend(self.chunk_orders(signal))
+            values.extend(self.values[signal])
+
+        def column(data, arrow_type):  # Wraps the array's memory, no copy
+            return pyarrow.Array.from_buffers(arrow_type, len(data),
+                                              [None, pyarrow.py_buffer(data)])
+
+        return pyarrow.table(
+            dict(Signal=pyarrow.DictionaryArray.from_arrays(
+                column(indices, pyarrow.int32()), pyarrow.array(self.signals,
+                                                                type=pyarrow.string())),
+                 ChunkOrder=column(chunk_orders, pyarrow.int64()),
+                 Value=column(values, pyarrow.float64())))
+
+
+class DecodeSink(ResultSink):
+    # Results decoded by decoder in the executor, in batches, and collected by accumulator.
+    # Results are also passed on to sink, e.g. a FileSink to keep the raw results too. Read
+    # the accumulator after close()
+    def __init__(self,
+                 decoder,
+                 accumulator=None,
+                 sink=None,
+                 executor=None,
+                 batch_size=32):
+        super().__init__(executor, batch_size)
+        self.decoder = decoder
+        self.accumulator = accumulator if accumulator is not None else ColumnarResults()
+        self.sink = sink
+
+    def start(self):
+        super().start()
+        if self.sink:
+            self.sink.start()
+
+    def put(self, counter, body):
+        super().put(counter, body)
+        if self.sink:
+            self.sink.put(counter, body)
+
+    async def close(self):
+        await super().close()
+        if self.sink:
+            await self.sink.close()
+
+    def write_batch(self, batch):
+        # Only one batch at a time is handed to the executor, so the accumulator never sees
+        # two threads at once
+        for _, body, _ in batch:
+            self.accumulator.add(self.decoder(body))
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import time
+
+
+class ResultSink():
+    # Results are queued by put() and written by a background task, in batches, in an executor,
+    # so a slow disk never blocks the event loop
+    def __init__(self, executor=None, batch_size=32):
+        self.executor = executor  # Where the files are written, None for the default executor
+        self.batch_size = batch_size  # Maximum number of results written in one go
+        self.queue = None
+        self.writer = None
+        self.stats = dict(written=0, bytes=0, batches=0, max_queue_depth=0, write_time=0.0,
+                          max_write_latency=0.0)
+
+    @property
+    def queue_depth(self):
+        # Results received but not written yet
+        return self.queue.qsize() if self.queue else 0
+
+    def start(self):
+        if not self.writer:
+            self.queue = asyncio.Queue()
+            self.writer = asyncio.ensure_future(self.handle_write())
+
+    def put(self, counter, body):
+        # body may be a memoryview into the received frame, it is written without a copy
+        self.queue.put_nowait((counter, body, time.perf_counter()))
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue.qsize())
+
+    async def close(self):
+        # Waits until everything queued so far has been written
+        if self.writer:
+            self.queue.put_nowait(None)
+            await self.writer
+            self.writer = None
+
+    async def handle_write(self):
+        loop = asyncio.get_event_loop()
+        done = False
+        while not done:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            await loop.run_in_executor(self.executor, self.write_batch, batch)
+            end = time.perf_counter()
+            self.stats['written'] += len(batch)
+            self.stats['bytes'] += sum(len(body) for _, body, _ in batch)
+            self.stats['batches'] += 1
+            self.stats['write_time'] += end - start
+            self.stats['max_write_latency'] = max(self.stats['max_write_latency'],
+                                                  end - batch[0][2])
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+
+class FileSink(ResultSink):
+    # One result_N.bin file per result, like subscribeResults always did
+    def __init__(self, out_folder, executor=None, batch_size=32):
+        super().__init__(executor, batch_size)
+        self.out_folder = out_folder
+        if not os.path.isdir(self.out_folder):  # Create directory if not there
+            os.makedirs(self.out_folder)
+
+    def write_batch(self, batch):
+        for counter, body, _ in batch:
+            with open(os.path.join(self.out_folder, 'result_' + str(counter) + '.bin'), 'wb') as f:
+                f.write(body)
+
+
+class ContainerSink(ResultSink):
+    # Every result appended to a single results.bin, with one JSON line per result in
+    # results.idx giving its Offset and Size in results.bin
+    def __init__(self, out_folder, executor=None, batch_size=32):
+        super().__init__(executor, batch_size)
+        self.out_folder = out_folder
+        if not os.path.isdir(self.out_folder):  # Create directory if not there
+            os.makedirs(self.out_folder)
+        self.data_path = os.path.join(self.out_folder, 'results.bin')
+        self.index_path = os.path.join(self.out_folder, 'results.idx')
+
+    def write_batch(self, batch):
+        index = []
+        with open(self.data_path, 'ab') as data_file:
+            offset = data_file.tell()
+            for counter, body, _ in batch:
+                data_file.write(body)
+                index.append(json.dumps(dict(Result=counter, Offset=offset, Size=len(body))))
+                offset += len(body)
+        # The index is written after the data, so every index entry points to complete data
+        with open(self.index_path, 'a') as index_file:
+            index_file.write('\n'.join(index) + '\n')
+
+    @staticmethod
+    def read_index(out_folder):
+        with open(os.path.join(out_folder, 'results.idx')) as index_file:
+            return [json.loads(line) for line in index_file if line.strip()]
+
+    @staticmethod
+    def read_result(out_folder, entry):
+        with open(os.path.join(out_folder, 'results.bin'), 'rb') as data_file:
+            data_file.seek(entry['Offset'])
+            return data_file.read(entry['Size'])
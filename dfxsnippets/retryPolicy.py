@@ -0,0 +1,107 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+
+class RetryPolicy():
+    # How fast requests may be sent, and when a failed one is sent again. Share one policy
+    # between every measurement of the process, so that together they send no faster than the
+    # server accepts:
+    #
+    # * Requests aren't limited until the server first throttles one (429 or 503). From then
+    #   on a token bucket lets `rate` requests per second through, in bursts of up to `burst`.
+    #   Every throttled response multiplies the rate by `decrease` (at most once per second),
+    #   and every success adds increase / rate to it, i.e. about `increase` requests per
+    #   second, every second (AIMD, like TCP congestion control).
+    # * A request that failed with one of retry_statuses, or got no response, is sent again,
+    #   up to max_attempts times in all, after a random delay of up to backoff_base,
+    #   2 * backoff_base, ... (at most backoff_max) seconds ("full jitter"), or after the
+    #   server's Retry-After if that is longer.
+    def __init__(self,
+                 max_attempts=5,
+                 backoff_base=0.5,
+                 backoff_max=30.0,
+                 rate=None,
+                 burst=10,
+                 min_rate=1.0,
+                 increase=1.0,
+                 decrease=0.5,
+                 retry_statuses=('429', '500', '502', '503', '504'),
+                 throttle_statuses=('429', '503')):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate = rate  # Requests per second, None until the server first throttles
+        self.burst = burst
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.retry_statuses = retry_statuses
+        self.throttle_statuses = throttle_statuses
+        self.tokens = burst
+        self.updated = time.monotonic()  # When tokens was last topped up
+        self.decreased = None  # When the rate was last decreased
+        self.sent = deque()  # When each request of the last second was let through
+        self.lock = None  # asyncio.Lock, so waiting requests go through in order
+        self.stats = dict(requests=0, throttled=0, retries=0)
+
+    async def acquire(self):
+        # Wait until a request may be sent
+        if self.rate is not None:
+            if self.lock is None:
+                self.lock = asyncio.Lock()
+            async with self.lock:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst,
+                                      self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        now = time.monotonic()
+        self.sent.append(now)
+        while now - self.sent[0] > 1.0:
+            self.sent.popleft()
+        self.stats['requests'] += 1
+
+    def on_response(self, status_code):
+        # Adapt the rate to the status code (a str, e.g. '200') of a response, None if there
+        # was no response
+        now = time.monotonic()
+        if status_code in self.throttle_statuses:
+            self.stats['throttled'] += 1
+            if self.decreased is None or now - self.decreased >= 1.0:
+                # The first time, from the rate requests were actually sent at
+                rate = self.rate if self.rate is not None else len(self.sent)
+                self.rate = max(self.min_rate, rate * self.decrease)
+                self.tokens = min(self.tokens, 1)
+                self.updated = now
+                self.decreased = now
+        elif status_code == '200' and self.rate is not None:
+            self.rate += self.increase / self.rate
+
+    def should_retry(self, status_code, attempt, statuses=None):
+        # Whether to send again after attempt (0 for the first) ended with status_code; only
+        # the given statuses (and no response) if not all retry_statuses are safe to retry
+        statuses = self.retry_statuses if statuses is None else statuses
+        return attempt + 1 < self.max_attempts and (status_code is None or
+                                                    status_code in statuses)
+
+    def backoff(self, attempt, retry_after=None):
+        # Seconds to wait before sending again after attempt
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        self.stats['retries'] += 1
+        return delay
+
+    @staticmethod
+    def retry_after(response):
+        # The Retry-After of a REST response, in seconds, if it has one
+        try:
+            return float(response.headers['Retry-After'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
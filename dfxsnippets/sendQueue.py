@@ -0,0 +1,135 @@
+import asyncio
+from collections import deque
+
+
+class SendQueue():
+    # Frames waiting to be sent on a websocket connection. Control frames (any route not in
+    # bulk_routes, e.g. 0510 subscribe) always go first; bulk frames (0506 add data) are taken
+    # from each stream (e.g. measurement) in turn, quantum * weight bytes per turn (deficit
+    # round-robin), so one measurement with big chunks can't starve the others. Once
+    # high_water bytes are queued, putting a bulk frame waits until the queue has drained to
+    # low_water, unless its stream holds less than its share of low_water, so a busy stream
+    # filling the queue never holds up the others.
+    def __init__(self, high_water=4 * 2**20, low_water=1 * 2**20, quantum=64 * 2**10,
+                 bulk_routes=('0506', )):
+        self.high_water = high_water
+        self.low_water = low_water
+        self.quantum = quantum
+        self.bulk_routes = set(route.encode() for route in bulk_routes)
+        self.control = deque()  # (content, future) of control frames
+        self.streams = {}  # stream -> deque of (content, future) of bulk frames
+        self.stream_bytes = {}  # stream -> bytes of its queued frames
+        self.ready = deque()  # Streams with frames, in round-robin order
+        self.weights = {}  # stream -> share of the bandwidth, 1 if not set
+        self.deficit = {}  # stream -> bytes it may still send this turn
+        self.granted = False  # Whether self.ready[0] got its quantum this turn
+        self.queued_bytes = 0
+        self.failures = 0  # Number of times fail() was called
+        self.failure = None  # The exception fail() was last called with
+        self.not_empty = asyncio.Event()
+        self.drained = asyncio.Event()  # Set while put() doesn't have to wait
+        self.drained.set()
+        self.stats = dict(frames=0, bytes=0, control_frames=0, waits=0, max_queued_bytes=0)
+
+    def __len__(self):
+        return len(self.control) + sum(len(queue) for queue in self.streams.values())
+
+    def set_weight(self, stream, weight):
+        self.weights[stream] = weight
+
+    def is_control(self, content):
+        return bytes(content[0:4]) not in self.bulk_routes
+
+    def must_wait(self, stream):
+        # Over high_water, a bulk frame waits if its stream holds at least its share of
+        # low_water. A stream holding nothing never waits, it isn't what filled the queue (and
+        # then there may be no streams to share low_water between)
+        held = self.stream_bytes.get(stream, 0)
+        return (self.queued_bytes >= self.high_water and held > 0
+                and held >= self.low_water / len(self.streams))
+
+    async def put(self, content, stream=None):
+        # Queue a frame; the returned future is done once the frame has been sent
+        control = self.is_control(content)
+        if not control:
+            failures = self.failures
+            while self.must_wait(stream):
+                self.stats['waits'] += 1
+                await self.drained.wait()
+                if self.failures != failures:  # Don't send it on the next connection
+                    raise self.failure
+
+        future = asyncio.get_event_loop().create_future()
+        if control:
+            self.control.append((content, future))
+        else:
+            if stream not in self.streams:
+                self.streams[stream] = deque()
+                self.stream_bytes[stream] = 0
+                self.deficit[stream] = 0
+                self.ready.append(stream)
+            self.streams[stream].append((content, future))
+            self.stream_bytes[stream] += len(content)
+        self.queued_bytes += len(content)
+        self.stats['max_queued_bytes'] = max(self.stats['max_queued_bytes'], self.queued_bytes)
+        if self.queued_bytes >= self.high_water:
+            self.drained.clear()
+        self.not_empty.set()
+        return future
+
+    async def get(self):
+        # The next frame to send, as (content, future)
+        while not self.control and not self.ready:
+            self.not_empty.clear()
+            await self.not_empty.wait()
+
+        if self.control:
+            item = self.control.popleft()
+            self.stats['control_frames'] += 1
+        else:
+            while True:
+                stream = self.ready[0]
+                if not self.granted:
+                    self.deficit[stream] += self.quantum * self.weights.get(stream, 1)
+                    self.granted = True
+                queue = self.streams[stream]
+                if self.deficit[stream] >= len(queue[0][0]):
+                    break
+                self.ready.rotate(-1)  # Next stream's turn
+                self.granted = False
+            item = queue.popleft()
+            self.deficit[stream] -= len(item[0])
+            self.stream_bytes[stream] -= len(item[0])
+            if not queue:
+                del self.streams[stream]
+                del self.stream_bytes[stream]
+                del self.deficit[stream]
+                self.ready.popleft()
+                self.granted = False
+
+        self.queued_bytes -= len(item[0])
+        self.stats['frames'] += 1
+        self.stats['bytes'] += len(item[0])
+        if self.queued_bytes <= self.low_water:
+            self.drained.set()
+        return item
+
+    def fail(self, exception):
+        # Drop every queued frame, e.g. when the connection is lost; their futures, and the
+        # puts waiting for the queue to drain, get exception
+        self.failures += 1
+        self.failure = exception
+        items = list(self.control)
+        for queue in self.streams.values():
+            items.extend(queue)
+        self.control.clear()
+        self.streams = {}
+        self.stream_bytes = {}
+        self.deficit = {}
+        self.ready.clear()
+        self.granted = False
+        self.queued_bytes = 0
+        self.drained.set()
+        for _, future in items:
+            if not future.done():
+                future.set_exception(exception)
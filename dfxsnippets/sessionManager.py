@@ -0,0 +1,170 @@
+import asyncio
+import os
+
+from dfxsnippets.addData import addData
+from dfxsnippets.createMeasurement import createMeasurement
+from dfxsnippets.dfxClient import supervise
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.payloadIndex import PayloadIndex
+from dfxsnippets.restHelper import RestHandler
+from dfxsnippets.subscribeResults import subscribeResults
+from dfxsnippets.websocketHelper import WebsocketHandler
+
+
+class SessionManager():
+    def __init__(self,
+                 token,
+                 rest_url,
+                 ws_url,
+                 conn_method='Websocket',
+                 num_connections=1,
+                 max_sessions=None,
+                 rest_pool_size=10,
+                 pacing='realtime',
+                 window=1,
+                 executor=None,
+                 result_container=False,
+                 cache=None,
+                 metrics=None,
+                 config=None,
+                 pool=None,
+                 compression=None,
+                 compression_level=None,
+                 encoder=None,
+                 retry_policy=None,
+                 ack_timeout=30.0,
+                 result_timeout=120.0):
+        self.token = token
+        self.rest_url = rest_url
+        self.ws_url = ws_url
+        self.conn_method = conn_method
+        self.max_sessions = max_sessions
+        self.pacing = pacing  # How addData paces the chunks, see addData.sendAsync()
+        self.window = window
+        self.executor = executor  # Where addData prepares the chunks, None for the default
+        self.encoder = encoder  # EncodingPool preparing the chunks instead of executor
+        self.retry_policy = retry_policy  # RetryPolicy shared by every session, see addData
+        self.ack_timeout = ack_timeout  # Seconds for each chunk to be acknowledged
+        self.result_timeout = result_timeout  # Seconds to wait for each result
+        self.result_container = result_container  # Results in one container file, not one each
+        self.cache = cache  # ChunkCache shared by every addData
+        self.compression = compression  # 'gzip' or 'zstd' for REST bodies, see addData
+        self.compression_level = compression_level
+        self.metrics = metrics if metrics else Metrics()  # Shared by every object
+        self.rest_obj = RestHandler(token, rest_url, pool_size=rest_pool_size)
+        self.pool = pool  # MeasurementPool to take measurement IDs and connections from
+        self.ws_objs = [] if pool else [
+            WebsocketHandler(token, ws_url, config=config, metrics=self.metrics)
+            for _ in range(num_connections)
+        ]
+        self.load = {id(ws_obj): 0 for ws_obj in self.ws_objs}  # Sessions per connection
+
+    async def connect(self):
+        if self.pool:
+            await self.pool.start()
+        await asyncio.gather(*(ws_obj.connect_ws() for ws_obj in self.ws_objs))
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+        await asyncio.gather(*(ws_obj.handle_close() for ws_obj in self.ws_objs if ws_obj.ws))
+        self.rest_obj.close()
+
+    def checkout_connection(self):
+        # Least loaded connection, counted in sessions multiplexed on it
+        ws_obj = min(self.ws_objs, key=lambda ws_obj: self.load[id(ws_obj)])
+        self.load[id(ws_obj)] += 1
+        return ws_obj
+
+    def checkin_connection(self, ws_obj):
+        self.load[id(ws_obj)] -= 1
+
+    async def run_measurement(self, studyID, input_directory, out_folder=None):
+        # Check the directory before a measurement is made for it
+        manifest = PayloadIndex(input_directory)
+        if self.pool:
+            ws_obj = await self.pool.checkout_connection()
+        else:
+            ws_obj = self.checkout_connection()
+        measurementID = None
+        try:
+            if self.pool:
+                measurementID = await self.pool.checkout_measurement(studyID)
+            else:
+                createmeasurementObj = createMeasurement(studyID,
+                                                         self.token,
+                                                         self.rest_url,
+                                                         restobj=self.rest_obj,
+                                                         metrics=self.metrics,
+                                                         retry_policy=self.retry_policy)
+                measurementID = await createmeasurementObj.createAsync()
+
+            if self.conn_method == 'REST':
+                adddataObj = addData(measurementID,
+                                     self.token,
+                                     self.rest_url,
+                                     None,
+                                     input_directory,
+                                     restobj=self.rest_obj,
+                                     executor=self.executor,
+                                     encoder=self.encoder,
+                                     cache=self.cache,
+                                     metrics=self.metrics,
+                                     manifest=manifest,
+                                     compression=self.compression,
+                                     compression_level=self.compression_level,
+                                     ack_timeout=self.ack_timeout,
+                                     retry_policy=self.retry_policy)
+            else:
+                adddataObj = addData(measurementID,
+                                     self.token,
+                                     self.rest_url,
+                                     ws_obj,
+                                     input_directory,
+                                     executor=self.executor,
+                                     encoder=self.encoder,
+                                     cache=self.cache,
+                                     metrics=self.metrics,
+                                     manifest=manifest,
+                                     ack_timeout=self.ack_timeout,
+                                     retry_policy=self.retry_policy)
+            subscriberesultsObj = subscribeResults(measurementID,
+                                                   self.token,
+                                                   ws_obj,
+                                                   adddataObj.num_chunks,
+                                                   out_folder=out_folder,
+                                                   container=self.result_container,
+                                                   metrics=self.metrics,
+                                                   timeout=self.result_timeout)
+
+            async def add_data():
+                if not await adddataObj.sendAsync(self.pacing, self.window):
+                    raise ValueError('Cannot add data to measurement {}'.format(measurementID))
+
+            # A refused chunk cancels the subscription instead of waiting for its results
+            await supervise(add_data(), subscriberesultsObj.subscribe())
+        finally:
+            if self.pool:
+                self.pool.checkin_connection(ws_obj)
+            else:
+                self.checkin_connection(ws_obj)
+        return measurementID
+
+    async def run(self, studyID, input_directories, output_directory=None):
+        # Run one measurement per input directory, all of them at the same time
+        if output_directory and not os.path.isdir(output_directory):
+            os.makedirs(output_directory)
+        semaphore = asyncio.Semaphore(self.max_sessions) if self.max_sessions else None
+
+        async def run_one(input_directory):
+            out_folder = None
+            if output_directory:
+                out_folder = os.path.join(output_directory,
+                                          os.path.basename(os.path.normpath(input_directory)))
+            if semaphore:
+                async with semaphore:
+                    return await self.run_measurement(studyID, input_directory, out_folder)
+            return await self.run_measurement(studyID, input_directory, out_folder)
+
+        return await asyncio.gather(*(run_one(d) for d in input_directories),
+                                    return_exceptions=True)
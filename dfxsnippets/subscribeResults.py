@@ -1,66 +1,101 @@
 import asyncio
-import os
-import uuid
 
-from google.protobuf.json_format import ParseDict
-from dfxsnippets.measurement_pb2 import SubscribeResultsRequest
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.resultSink import ContainerSink, FileSink
 
 
 class subscribeResults():
-    def __init__(self, measurementID, token, websocketobj, num_chunks, out_folder=None):
+    def __init__(self,
+                 measurementID,
+                 token,
+                 websocketobj,
+                 num_chunks,
+                 out_folder=None,
+                 sink=None,
+                 container=False,
+                 metrics=None,
+                 timeout=None):
         self.measurementID = measurementID
         self.token = token
         self.ws_url = websocketobj.ws_url
         self.num_chunks = num_chunks
+        self.requestID = None
         self.requestData = None
         self.ws_obj = websocketobj
         self.out_folder = out_folder
+        self.metrics = metrics if metrics else Metrics()
+        self.timeout = timeout  # Seconds to wait for each result, None for ever
 
-        if self.out_folder and not os.path.isdir(
-                self.out_folder):  # Create directory if not there
-            os.mkdir(self.out_folder)
+        # Where the results go; one file per result, or a single container file if container
+        self.sink = sink
+        if not self.sink and self.out_folder:
+            self.sink = ContainerSink(self.out_folder) if container else FileSink(self.out_folder)
 
     async def prepare_data(self):
-        data = {}
-        wsID = self.ws_obj.ws_ID
-        requestID = uuid.uuid4().hex[:10]
-        data['RequestID'] = requestID
-        data['Query'] = {}
-        data['Params'] = dict(ID=self.measurementID)
+        from dfxsnippets.measurement_pb2 import SubscribeResultsRequest  # Only when subscribing
+
+        requestID = self.ws_obj.new_request_id()
+        self.requestID = requestID
+        requestMessageProto = SubscribeResultsRequest()
+        requestMessageProto.RequestID = requestID
+        requestMessageProto.Params.ID = self.measurementID
 
         websocketRouteID = '0510'
-        requestMessageProto = ParseDict(data,
-                                        SubscribeResultsRequest(),
-                                        ignore_unknown_fields=True)
-        self.requestData = f'{websocketRouteID:4}{wsID:10}'.encode(
+        self.requestData = f'{websocketRouteID:4}{requestID:10}'.encode(
         ) + requestMessageProto.SerializeToString()
 
-    async def subscribe(self):
-        print("Subscribing to results")
+    async def aiter_results(self):
+        # Yield (counter, body) for every result as it arrives, until num_chunks results were
+        # received (or for ever if num_chunks is None). body is a memoryview into the
+        # received frame
+        self.metrics.log("Subscribing to results")
         await self.prepare_data()
-        await self.ws_obj.handle_send(self.requestData)
+        # Sent again by the WebsocketHandler if it has to reconnect
+        queue = await self.ws_obj.handle_subscribe(self.requestID, self.requestData)
 
         counter = 0
-        while counter < self.num_chunks:
-            await self.ws_obj.handle_recieve()
-            if self.ws_obj.subscribeStats:
-                response = self.ws_obj.subscribeStats[0]
-                self.ws_obj.subscribeStats = []
-                statusCode = response[10:13].decode('utf-8')
-                if statusCode != '200':
-                    print("Status:", statusCode)
+        statusCode = None
+        try:
+            while self.num_chunks is None or counter < self.num_chunks:
+                try:
+                    response = await asyncio.wait_for(queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    raise asyncio.TimeoutError('No result for {} within {} seconds'.format(
+                        self.measurementID, self.timeout)) from None
+                if response is None:
+                    raise ConnectionError('Websocket closed before all results were received')
 
-            elif self.ws_obj.chunks:
-                counter += 1
-                response = self.ws_obj.chunks[0]
-                self.ws_obj.chunks = []
-                print("Data received; Chunk: " + str(counter) + "; Status: " +
-                      str(statusCode))
+                if self.ws_obj.classify(response) == 'subscribeStatus':
+                    statusCode = response[10:13].decode('utf-8')
+                    if statusCode != '200':
+                        self.metrics.log("Status:", statusCode)
 
-                if self.out_folder:
-                    with open(self.out_folder + '/result_' + str(counter) + '.bin',
-                              'wb') as f:
-                        f.write(response[13:])
+                else:
+                    counter += 1
+                    self.metrics.log("Data received; Chunk: " + str(counter) + "; Status: " +
+                                     str(statusCode))
+                    _, _, body = self.ws_obj.parse_response(response)
+                    self.metrics.event('result', self.measurementID, counter, len(body))
+                    yield counter, body
+            self.metrics.event('done', self.measurementID)
+        finally:
+            self.ws_obj.unsubscribe(self.requestID)
+            if self.num_chunks is None or counter < self.num_chunks:  # No 'done' will come
+                self.metrics.discard(self.measurementID, 'created')
+
+    async def subscribe(self):
+        if self.sink:
+            self.sink.start()
+        results = self.aiter_results()
+        try:
+            async for counter, body in results:
+                if self.sink:
+                    self.sink.put(counter, body)
+                    self.metrics.gauge('result_queue_depth', self.sink.queue_depth)
+        finally:
+            await results.aclose()  # Unsubscribes straight away, even when cancelled
+            if self.sink:
+                await self.sink.close()
         return
 
 
@@ -1,64 +1,313 @@
+import asyncio
 import json
 import uuid
+from typing import NamedTuple, Optional
 
-import websockets
+from dfxsnippets.metrics import Metrics
+from dfxsnippets.sendQueue import SendQueue
+
+
+class WebsocketConfig(NamedTuple):
+    # Response lengths used to classify frames whose request route is unknown
+    subscribe_status: int = 13
+    adddata_status: int = 60
+
+    # Reconnecting after the connection drops, waiting backoff_base, 2 * backoff_base, ...
+    # (at most backoff_max) seconds between attempts; 0 max_reconnects never reconnects
+    max_reconnects: int = 5
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+
+    # Bytes of add data frames queued for sending above which senders wait, until the queue
+    # drains below send_low_water
+    send_high_water: int = 4 * 2**20
+    send_low_water: int = 1 * 2**20
+
+    # Per-message compression negotiated with the server: 'deflate', or None for none, at the
+    # zlib compression_level (None for the websockets default). websockets compresses every
+    # frame in ws.send(), on the event loop
+    compression: Optional[str] = 'deflate'
+    compression_level: Optional[int] = None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as json_file:
+            data = json.load(json_file)
+        defaults = cls()
+        level = data.get("Compression_level", defaults.compression_level)
+        return cls(subscribe_status=int(data["Subscribe_status"]),
+                   adddata_status=int(data["Adddata_status"]),
+                   max_reconnects=int(data.get("Max_reconnects", defaults.max_reconnects)),
+                   backoff_base=float(data.get("Backoff_base", defaults.backoff_base)),
+                   backoff_max=float(data.get("Backoff_max", defaults.backoff_max)),
+                   send_high_water=int(data.get("Send_high_water", defaults.send_high_water)),
+                   send_low_water=int(data.get("Send_low_water", defaults.send_low_water)),
+                   compression=data.get("Compression", defaults.compression) or None,
+                   compression_level=None if level is None else int(level))
 
 
 class WebsocketHandler():
-    def __init__(self, token, websocket_url):
+    def __init__(self, token, websocket_url, config=None, metrics=None):
         self.token = token
         self.ws_url = websocket_url
+        self.config = config if config else WebsocketConfig()
+        self.metrics = metrics if metrics else Metrics()
         self.headers = dict(Authorization="Bearer {}".format(self.token))
         self.ws = None
-        self.ws_ID = uuid.uuid4().hex[:10]  # Use same ws_ID for all connections
-
-        # Use this to form a mutual exclusion lock
-        self.recv = True
+        self.reader = None  # Background task reading every frame of the connection
+        self.writer = None  # Background task sending every frame of self.send_queue
+        self.send_queue = None  # SendQueue, frames waiting to be sent
+        self.connected = None  # asyncio.Event, set while frames can be sent
+        self.closed = False  # Closed for good, by handle_close() or after failing to reconnect
+        self.reconnects = 0
 
-        # Lists for tracking return values
-        self.addDataStats = []
-        self.subscribeStats = []
-        self.chunks = []
-        self.unknown = {
-        }  # For storing messages not coming from a known websocket sender
+        # Frames are routed by the 10-char request ID at the start of every response
+        self.pending = {}  # One-shot requests (e.g. add data), requestID -> asyncio.Future
+        self.subscriptions = {}  # Streaming requests (e.g. results), requestID -> asyncio.Queue
+        self.routes = {}  # requestID -> the 4-digit route it was sent on
+        self.resend = {}  # Subscription frames to send again after a reconnect, requestID -> frame
+        self.unmatched = 0  # Frames dropped because nobody was waiting for their request ID
+        self.write_error = None  # Why the writer stopped, if it did
 
     async def connect_ws(self):
         if not self.ws:
             self.ws = await self.handle_connect()
+            self.connected = asyncio.Event()
+            self.connected.set()
+            self.send_queue = SendQueue(self.config.send_high_water, self.config.send_low_water)
+            self.reader = asyncio.ensure_future(self.handle_recieve())
+            self.writer = asyncio.ensure_future(self.handle_write())
 
     async def handle_connect(self):
-        ws = await websockets.client.connect(self.ws_url, extra_headers=self.headers)
-        print(" Websocket Connected ")
+        # websockets is only imported once a connection is made, so importing this module
+        # (e.g. for REST only) stays cheap
+        import websockets.client
+        ws = await websockets.client.connect(self.ws_url,
+                                             extra_headers=self.headers,
+                                             **self.compression_args())
+        self.metrics.log(" Websocket Connected ")
         return ws
 
+    def compression_args(self):
+        # The connect() arguments for self.config's compression
+        if not self.config.compression or self.config.compression_level is None:
+            return dict(compression=self.config.compression)
+        from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+        # The same memory setting as websockets uses by default
+        factory = ClientPerMessageDeflateFactory(
+            compress_settings=dict(memLevel=5, level=self.config.compression_level))
+        return dict(compression=None, extensions=[factory])
+
+    async def handle_reconnect(self):
+        # Reconnect with exponential backoff, then send every active subscription again
+        import websockets
+        for attempt in range(self.config.max_reconnects):
+            await asyncio.sleep(
+                min(self.config.backoff_max, self.config.backoff_base * 2**attempt))
+            try:
+                self.ws = await asyncio.wait_for(self.handle_connect(), timeout=10)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                self.metrics.log(" Reconnect attempt", attempt + 1, "failed:", e)
+                continue
+            self.reconnects += 1
+            self.metrics.event('reconnect')
+            try:
+                for content in list(self.resend.values()):
+                    await self.ws.send(content)
+            except websockets.ConnectionClosed:
+                continue
+            self.connected.set()
+            return True
+        return False
+
     async def handle_close(self):
-        print(" Closing Websocket ")
+        self.metrics.log(" Closing Websocket ")
+        self.closed = True
+        if self.connected and not self.connected.is_set():
+            self.reader.cancel()  # Still trying to reconnect
         await self.ws.close()
+        for task in (self.reader, self.writer):
+            if task:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         return
 
-    async def handle_send(self, content):
-        await self.ws.send(content)
+    async def handle_send(self, content, stream=None):
+        # Waits while reconnecting, and while too many bytes are queued; returns once the frame
+        # was sent, raises ConnectionError if it can't be. Add data frames of different
+        # streams (e.g. measurements) take turns, other frames (e.g. subscribe) go first
+        if not self.connected.is_set():
+            await self.connected.wait()
+        if self.closed:
+            raise ConnectionError('Websocket closed')
+        if self.write_error:  # The writer is gone, nothing would ever send the frame
+            raise RuntimeError('Websocket writer stopped') from self.write_error
+        sent = await self.send_queue.put(content, stream)
+        self.metrics.gauge('ws_send_queue_bytes', self.send_queue.queued_bytes)
+        await sent
 
-    async def handle_recieve(self):
-        if self.recv:
-            # Mutual exclusion lock; prevents multiple calls of recv() on the same websocket connection
-            self.recv = False
-            response = await self.ws.recv()
-            self.recv = True
+    async def handle_write(self):
+        # The only place where ws.send() is called, except when resending subscriptions after
+        # a reconnect. ws.send() itself waits while the socket's write buffer is full, which is
+        # what keeps frames in self.send_queue, where they are still fairly scheduled. If it
+        # stops, cancelled or because ws.send() raised something else than ConnectionClosed,
+        # the frame it was sending and every queued one fail, and so does every later send
+        import websockets
+        sent = None
+        try:
+            while True:
+                content, sent = await self.send_queue.get()
+                if sent.done():  # The sender gave up
+                    continue
+                ws = self.ws
+                try:
+                    await ws.send(content)
+                except websockets.ConnectionClosed:
+                    if ws is self.ws:
+                        self.connected.clear()
+                    sent.set_exception(ConnectionError('Websocket closed'))
+                    self.send_queue.fail(ConnectionError('Websocket closed'))
+                    continue
+                sent.set_result(None)
+        except asyncio.CancelledError:  # Closing
+            self.stop_writing(sent, ConnectionError('Websocket closed'))
+            raise
+        except Exception as e:  # e.g. a TypeError, or an error of the compression extension
+            self.metrics.log(" Websocket writer stopped:", repr(e))
+            self.stop_writing(sent, e)
+
+    def stop_writing(self, sent, exception):
+        # No frame will be sent any more: fail the one being sent, the queued ones and, with
+        # write_error, the ones handle_send() is asked for later
+        self.write_error = exception
+        if sent is not None and not sent.done():
+            sent.set_exception(exception)
+        self.send_queue.fail(exception)
+
+    async def wait_connected(self):
+        # After a ConnectionError: True once the connection is back, False if it is gone for good
+        await self.connected.wait()
+        return not self.closed
+
+    @staticmethod
+    def new_request_id():
+        return uuid.uuid4().hex[:10]
+
+    def expect_response(self, requestID, route=None):
+        future = asyncio.get_event_loop().create_future()
+        self.pending[requestID] = future
+        self.routes[requestID] = route
+        return future
+
+    def subscribe_queue(self, requestID, route='0510'):
+        queue = asyncio.Queue()
+        self.subscriptions[requestID] = queue
+        self.routes[requestID] = route
+        return queue
+
+    def unsubscribe(self, requestID):
+        self.subscriptions.pop(requestID, None)
+        self.routes.pop(requestID, None)
+        self.resend.pop(requestID, None)
+
+    async def handle_subscribe(self, requestID, content):
+        # Send a request with many responses; it is sent again if the connection is re-made
+        queue = self.subscribe_queue(requestID, route=bytes(content[0:4]).decode('utf-8'))
+        self.resend[requestID] = content
+        try:
+            await self.handle_send(content)
+        except ConnectionError:
+            # Lost with the connection, handle_reconnect() sends it again
+            if not await self.wait_connected():
+                raise
+        return queue
+
+    async def handle_request(self, requestID, content, stream=None):
+        # Register before sending so that a fast response can never be missed
+        future = self.expect_response(requestID, route=bytes(content[0:4]).decode('utf-8'))
+        self.metrics.gauge('ws_pending_requests', len(self.pending))
+        try:
+            await self.handle_send(content, stream)
+            return await future
+        finally:
+            self.pending.pop(requestID, None)
+            self.routes.pop(requestID, None)
+            if future.done() and not future.cancelled():
+                future.exception()  # Failed by fail_pending() while the frame was queued
+
+    @staticmethod
+    def parse_response(response):
+        # Buffer( [ string:10 requestID ][ string:3 status ][ string/buffer body ] )
+        view = memoryview(response)
+        return bytes(view[0:10]).decode('utf-8'), bytes(view[10:13]).decode('utf-8'), view[13:]
+
+    def classify(self, response):
+        requestID, statusCode, body = self.parse_response(response)
+        route = self.routes.get(requestID)
+        if route == '0510':
+            if statusCode != '200' or len(body) == 0:
+                return 'subscribeStatus'
+            return 'chunk'
+        elif route == '0506':
+            return 'addDataStatus'
+
+        # Unknown route, fall back to the response lengths
+        if len(response) == self.config.subscribe_status:
+            return 'subscribeStatus'
+        elif len(response) <= self.config.adddata_status:
+            return 'addDataStatus'
         else:
-            return
-        if response:
-            wsID = response[0:10].decode('utf-8')
-            if wsID != self.ws_ID:
-                self.unknown[wsID] = response
-
-            with open('./default.config') as json_file:
-                data = json.load(json_file)
-
-                if len(response) == int(data["Subscribe_status"]):
-                    self.subscribeStats.append(response)
-                elif len(response) <= int(data["Adddata_status"]):
-                    self.addDataStats.append(response)
-                else:
-                    self.chunks.append(response)
-        return
+            return 'chunk'
+
+    def dispatch(self, response):
+        requestID = response[0:10].decode('utf-8')
+        if requestID in self.pending:
+            future = self.pending.pop(requestID)
+            if not future.done():
+                future.set_result(response)
+        elif requestID in self.subscriptions:
+            self.subscriptions[requestID].put_nowait(response)
+        else:
+            # e.g. an ack that came after its ack_timeout, a duplicate ack, or a result after
+            # unsubscribing: nobody will ever ask for it, so it is dropped, not kept
+            self.unmatched += 1
+            self.metrics.event('unmatched', size=len(response))
+
+    def fail_pending(self):
+        # Requests sent on a lost connection never get a response
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError('Websocket closed'))
+        self.pending = {}
+
+    async def handle_recieve(self):
+        # The only place where ws.recv() is called; runs for the lifetime of the connection,
+        # including every reconnect
+        import websockets
+        try:
+            while True:
+                try:
+                    async for response in self.ws:
+                        if response:
+                            self.dispatch(response)
+                except websockets.ConnectionClosed:
+                    pass
+                if self.closed:
+                    break
+                self.metrics.log(" Websocket connection lost, reconnecting ")
+                self.connected.clear()
+                self.fail_pending()
+                self.send_queue.fail(ConnectionError('Websocket closed'))
+                if not await self.handle_reconnect():
+                    break
+                self.metrics.log(" Websocket Reconnected ")
+        finally:
+            self.closed = True
+            self.fail_pending()
+            self.send_queue.fail(ConnectionError('Websocket closed'))
+            self.writer.cancel()
+            for queue in self.subscriptions.values():
+                queue.put_nowait(None)  # Wakes up the subscribers
+            self.connected.set()  # Wakes up the senders, which see self.closed
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+
+from dfxsnippets.bulkIngest import BulkIngest
+from dfxsnippets.chunkCache import ChunkCache
+from dfxsnippets.metrics import JsonLinesExporter, Metrics, PrometheusExporter
+from dfxsnippets.retryPolicy import RetryPolicy
+from dfxsnippets.websocketHelper import WebsocketConfig
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DFX API bulk ingestion of payload directories")
+
+    parser.add_argument("studyID", help="StudyID")
+    parser.add_argument("token", help="user or device token")
+    parser.add_argument("payloadRoot", help="Directory holding the payload directories")
+    parser.add_argument("--restUrl",
+                        help="DFX API REST url",
+                        default="https://qa.api.deepaffex.ai:9443")
+    parser.add_argument("--wsUrl",
+                        help="DFX API Websocket url",
+                        default="wss://qa.api.deepaffex.ai:9080")
+    parser.add_argument("--outputDir", help="Directory for received files", default=None)
+    parser.add_argument("--progressFile",
+                        help="File recording finished measurements, to resume from",
+                        default="ingest_progress.jsonl")
+    parser.add_argument("--connectionMethod",
+                        help="Connection method",
+                        choices=["REST", "Websocket"],
+                        default="REST")
+    parser.add_argument("--resultContainer",
+                        help="Save the results in a single container file with an index",
+                        action="store_true")
+    parser.add_argument("--cacheDir",
+                        help="Directory to cache encoded chunks in, for repeated replays",
+                        default=None)
+    parser.add_argument("--cacheSize",
+                        help="Maximum size of the chunk cache in MB",
+                        type=int,
+                        default=1024)
+    parser.add_argument("--quiet",
+                        help="Don't print the progress of every chunk",
+                        action="store_true")
+    parser.add_argument("--metricsJson", help="File to write metric events to, as JSON lines")
+    parser.add_argument("--metricsProm", help="File to write metrics to, in Prometheus format")
+    parser.add_argument("--config", help="Websocket frame config file", default=None)
+    parser.add_argument("--concurrency",
+                        help="Measurements running at the same time",
+                        type=int,
+                        default=10)
+    parser.add_argument("--workers",
+                        help="Processes preparing chunks (default: one per CPU)",
+                        type=int,
+                        default=None)
+    parser.add_argument("--prefetch",
+                        help="Chunks of each measurement prepared ahead (default: --workers)",
+                        type=int,
+                        default=None)
+    parser.add_argument("--connections",
+                        help="Websocket connections to share between measurements",
+                        type=int,
+                        default=1)
+    parser.add_argument("--restPoolSize",
+                        help="Maximum number of open REST connections",
+                        type=int,
+                        default=10)
+    parser.add_argument("--pacing",
+                        help="How to pace the chunks, see measure.py",
+                        choices=["realtime", "ack", "window"],
+                        default="window")
+    parser.add_argument("--window",
+                        help="Unacknowledged chunks in flight with --pacing=window",
+                        type=int,
+                        default=4)
+
+    parser.add_argument("--compression",
+                        help="Compress REST request bodies",
+                        choices=["gzip", "zstd"],
+                        default=None)
+    parser.add_argument("--compressionLevel",
+                        help="Level of --compression and of the websocket's deflate",
+                        type=int,
+                        default=None)
+    parser.add_argument("--ackTimeout",
+                        help="Seconds for each chunk to be acknowledged",
+                        type=float,
+                        default=30.0)
+    parser.add_argument("--resultTimeout",
+                        help="Seconds to wait for each result before a measurement fails",
+                        type=float,
+                        default=120.0)
+    parser.add_argument("--maxAttempts",
+                        help="Times a throttled or failed request is sent, adapting the request "
+                        "rate to the server's; 0 to send every request once, unpaced",
+                        type=int,
+                        default=5)
+
+    args = parser.parse_args()
+
+    ws_config = WebsocketConfig.from_file(args.config) if args.config else WebsocketConfig()
+    if args.compressionLevel is not None:
+        ws_config = ws_config._replace(compression_level=args.compressionLevel)
+    cache = ChunkCache(args.cacheDir, args.cacheSize * 2**20) if args.cacheDir else None
+    exporters = []
+    if args.metricsJson:
+        exporters.append(JsonLinesExporter(args.metricsJson))
+    if args.metricsProm:
+        exporters.append(PrometheusExporter(args.metricsProm))
+    metrics = Metrics(*exporters, quiet=args.quiet)
+    # One policy for every measurement, so together they stay within the server's rate limit
+    retry_policy = RetryPolicy(max_attempts=args.maxAttempts) if args.maxAttempts else None
+    bulkingestObj = BulkIngest(args.token,
+                               args.restUrl,
+                               args.wsUrl,
+                               args.progressFile,
+                               workers=args.workers,
+                               prefetch=args.prefetch,
+                               conn_method=args.connectionMethod,
+                               num_connections=args.connections,
+                               rest_pool_size=args.restPoolSize,
+                               pacing=args.pacing,
+                               window=args.window,
+                               result_container=args.resultContainer,
+                               cache=cache,
+                               metrics=metrics,
+                               config=ws_config,
+                               compression=args.compression,
+                               compression_level=args.compressionLevel,
+                               retry_policy=retry_policy,
+                               ack_timeout=args.ackTimeout,
+                               result_timeout=args.resultTimeout)
+
+    try:
+        results = asyncio.run(
+            bulkingestObj.run(args.studyID, args.payloadRoot, args.outputDir, args.concurrency))
+    finally:
+        metrics.close()
+
+    failed = [r for r in results if isinstance(r, Exception)]
+    print("Done:", len(results) - len(failed), "Failed:", len(failed))
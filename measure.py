@@ -1,17 +1,19 @@
 import argparse
 import asyncio
 
-from dfxsnippets.addData import addData
-from dfxsnippets.createMeasurement import createMeasurement
-from dfxsnippets.subscribeResults import subscribeResults
-from dfxsnippets.websocketHelper import WebsocketHandler
+from dfxsnippets.chunkCache import ChunkCache
+from dfxsnippets.dfxClient import DfxClient
+from dfxsnippets.metrics import JsonLinesExporter, Metrics, PrometheusExporter
+from dfxsnippets.retryPolicy import RetryPolicy
+from dfxsnippets.sessionManager import SessionManager
+from dfxsnippets.websocketHelper import WebsocketConfig
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="DFX API Python snippets example")
 
     parser.add_argument("studyID", help="StudyID")
     parser.add_argument("token", help="user or device token")
-    parser.add_argument("payloadDir", help="Directory of payload files")
+    parser.add_argument("payloadDir", help="Directory of payload files", nargs="+")
     parser.add_argument("--restUrl",
                         help="DFX API REST url",
                         default="https://qa.api.deepaffex.ai:9443")
@@ -23,56 +25,151 @@ if __name__ == "__main__":
                         help="Connection method",
                         choices=["REST", "Websocket"],
                         default="REST")
+    parser.add_argument("--config", help="Websocket frame config file", default=None)
+    parser.add_argument("--connections",
+                        help="Websocket connections to share between measurements",
+                        type=int,
+                        default=1)
+    parser.add_argument("--restPoolSize",
+                        help="Maximum number of open REST connections",
+                        type=int,
+                        default=10)
+    parser.add_argument("--pacing",
+                        help="realtime: send each chunk at the time it was captured, "
+                        "ack: send each chunk once the previous one is acknowledged, "
+                        "window: keep up to --window chunks unacknowledged",
+                        choices=["realtime", "ack", "window"],
+                        default="realtime")
+    parser.add_argument("--window",
+                        help="Unacknowledged chunks in flight with --pacing=window",
+                        type=int,
+                        default=4)
+    parser.add_argument("--resultContainer",
+                        help="Save the results in a single container file with an index",
+                        action="store_true")
+    parser.add_argument("--cacheDir",
+                        help="Directory to cache encoded chunks in, for repeated replays",
+                        default=None)
+    parser.add_argument("--cacheSize",
+                        help="Maximum size of the chunk cache in MB",
+                        type=int,
+                        default=1024)
+    parser.add_argument("--quiet",
+                        help="Don't print the progress of every chunk",
+                        action="store_true")
+    parser.add_argument("--metricsJson", help="File to write metric events to, as JSON lines")
+    parser.add_argument("--metricsProm", help="File to write metrics to, in Prometheus format")
+    parser.add_argument("--maxSessions",
+                        help="Maximum number of concurrent measurements",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--compression",
+                        help="Compress REST request bodies",
+                        choices=["gzip", "zstd"],
+                        default=None)
+    parser.add_argument("--compressionLevel",
+                        help="Level of --compression and of the websocket's deflate",
+                        type=int,
+                        default=None)
+    parser.add_argument("--follow",
+                        help="Send the chunks while the DFX SDK is still writing them, until it "
+                        "writes the end marker (one payload directory only)",
+                        action="store_true")
+    parser.add_argument("--ackTimeout",
+                        help="Seconds to create a measurement or for each chunk to be "
+                        "acknowledged",
+                        type=float,
+                        default=30.0)
+    parser.add_argument("--resultTimeout",
+                        help="Seconds to wait for each result before a measurement fails",
+                        type=float,
+                        default=120.0)
+    parser.add_argument("--maxAttempts",
+                        help="Times a throttled or failed request is sent, adapting the request "
+                        "rate to the server's; 0 to send every request once, unpaced",
+                        type=int,
+                        default=5)
 
     args = parser.parse_args()
+    if args.follow and len(args.payloadDir) > 1:
+        parser.error("--follow takes a single payload directory")
 
     studyID = args.studyID
     token = args.token
     rest_url = args.restUrl
     ws_url = args.wsUrl
     conn_method = args.connectionMethod
-    input_directory = args.payloadDir
+    input_directories = args.payloadDir
     output_directory = args.outputDir
+    ws_config = WebsocketConfig.from_file(args.config) if args.config else WebsocketConfig()
+    if args.compressionLevel is not None:
+        ws_config = ws_config._replace(compression_level=args.compressionLevel)
+    cache = ChunkCache(args.cacheDir, args.cacheSize * 2**20) if args.cacheDir else None
+    exporters = []
+    if args.metricsJson:
+        exporters.append(JsonLinesExporter(args.metricsJson))
+    if args.metricsProm:
+        exporters.append(PrometheusExporter(args.metricsProm))
+    metrics = Metrics(*exporters, quiet=args.quiet)
+    # One policy for every measurement, so together they stay within the server's rate limit
+    retry_policy = RetryPolicy(max_attempts=args.maxAttempts) if args.maxAttempts else None
 
-    # Create the async event loop and list of tasks
-    loop = asyncio.get_event_loop()
-    tasks = []
-
-    # Create object for handling websockets
-    websocketobj = WebsocketHandler(token, ws_url)
-
-    # Establish websocket connection (must be done at the start)
-    # Note: Will time out in 10 seconds if connection is not established
-    tasks.append(loop.create_task(websocketobj.connect_ws()))
-    wait_tasks = asyncio.wait(tasks, timeout=10)
-    loop.run_until_complete(wait_tasks)
-
-    # Create a measurement object and get a measurement ID
-    createmeasurementObj = createMeasurement(studyID, token, rest_url)
-    measurementID = createmeasurementObj.create()
-
-    # Create an addData object (which prepares the data need to be sent in the input_directory)
-    if conn_method == 'REST':
-        adddataObj = addData(measurementID, token, rest_url, None, input_directory)
-    else:
-        adddataObj = addData(measurementID, token, rest_url, websocketobj,
-                             input_directory)
-
-    # Create subscribeResults Object which prepares the subscribe request
-    subscriberesultsObj = subscribeResults(measurementID,
-                                           token,
-                                           websocketobj,
-                                           adddataObj.num_chunks,
-                                           out_folder=output_directory)
-
-    # Add tasks to event loop
-    tasks.append(loop.create_task(adddataObj.sendAsync()))
-    tasks.append(loop.create_task(subscriberesultsObj.subscribe()))
+    # Several payload directories: run one measurement per directory, all multiplexed
+    # over a small pool of websocket connections
+    async def run_many():
+        sessionmanagerObj = SessionManager(token,
+                                           rest_url,
+                                           ws_url,
+                                           conn_method=conn_method,
+                                           num_connections=args.connections,
+                                           max_sessions=args.maxSessions,
+                                           rest_pool_size=args.restPoolSize,
+                                           pacing=args.pacing,
+                                           window=args.window,
+                                           result_container=args.resultContainer,
+                                           cache=cache,
+                                           metrics=metrics,
+                                           config=ws_config,
+                                           compression=args.compression,
+                                           compression_level=args.compressionLevel,
+                                           retry_policy=retry_policy,
+                                           ack_timeout=args.ackTimeout,
+                                           result_timeout=args.resultTimeout)
+        await sessionmanagerObj.connect()
+        try:
+            results = await sessionmanagerObj.run(studyID, input_directories, output_directory)
+        finally:
+            await sessionmanagerObj.close()
+        for input_directory, result in zip(input_directories, results):
+            print(input_directory, "->", result)
 
-    # Run add data and subscribe to results
-    wait_tasks = asyncio.wait(tasks)
-    loop.run_until_complete(wait_tasks)
+    # One payload directory: create a measurement, send the chunks and save the results
+    # at the same time. The client fails straight away if it can't connect within 10
+    # seconds, and cancels everything it started if anything goes wrong
+    async def run_one():
+        async with DfxClient(token,
+                             rest_url,
+                             ws_url,
+                             conn_method=conn_method,
+                             rest_pool_size=args.restPoolSize,
+                             cache=cache,
+                             metrics=metrics,
+                             config=ws_config,
+                             compression=args.compression,
+                             compression_level=args.compressionLevel,
+                             retry_policy=retry_policy,
+                             request_timeout=args.ackTimeout,
+                             result_timeout=args.resultTimeout) as client:
+            await client.measure(studyID,
+                                 input_directories[0],
+                                 out_folder=output_directory,
+                                 pacing=args.pacing,
+                                 window=args.window,
+                                 container=args.resultContainer,
+                                 follow=args.follow)
 
-    # Close websocket connection at the end
-    loop.run_until_complete(websocketobj.handle_close())
-    loop.close()
+    try:
+        asyncio.run(run_many() if len(input_directories) > 1 else run_one())
+    finally:
+        metrics.close()
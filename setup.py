@@ -8,5 +8,7 @@ setup(
     author='NuraLogix Development Team',
     author_email='dev@nuralogix.ai',
     license='N/A',
+    python_requires='>=3.8',
     packages=find_packages(),
-    install_requires=['requests', 'urllib3', 'websockets', 'protobuf'])
+    install_requires=['requests', 'urllib3', 'websockets', 'protobuf>=3.20'],
+    extras_require=dict(numpy=['numpy'], arrow=['pyarrow'], zstd=['zstandard']))